@@ -5,31 +5,34 @@ Works on desktop and mobile browsers, easier to deploy than native Android
 Now with comprehensive security protection
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory, session, redirect, url_for, flash, make_response
-from flask_session import Session
+from flask import Flask, render_template, request, jsonify, send_from_directory, session, redirect, url_for, flash, make_response, g
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_wtf.csrf import CSRFProtect, validate_csrf
 from werkzeug.security import check_password_hash, generate_password_hash
+from itsdangerous import TimestampSigner, BadSignature
 import json
 import os
 import sys
+import tempfile
+import threading
+import time
 import uuid
 from datetime import datetime, timedelta
 import logging
-from functools import wraps
+import operator
+from functools import lru_cache, wraps
 import secrets
 import hashlib
-from dateutil import parser
+import hmac
+import sqlite3
 
 app = Flask(__name__)
 
 # Security Configuration
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', secrets.token_hex(32))
-app.config['SESSION_TYPE'] = 'filesystem'
-app.config['SESSION_PERMANENT'] = False
+# Sessions use Flask's signed cookie; the payload is a few small fields
 app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hour
-app.config['SESSION_FILE_THRESHOLD'] = 100
 app.config['WTF_CSRF_TIME_LIMIT'] = 3600
 
 # Authentication Configuration - MUST be set via environment variables
@@ -42,13 +45,35 @@ if not USERNAME:
 if not PASSWORD_HASH:
     raise ValueError("NOTED_PASSWORD_HASH environment variable must be set")
 
+# Hash checked when the username is wrong so failed logins always cost one hash.
+# Built on a background thread at boot: worker boot doesn't wait for the KDF,
+# and no login request pays for generating it on top of checking it.
+_dummy_hash = None
+_dummy_hash_ready = threading.Event()
+
+def _build_dummy_password_hash():
+    """Generate the dummy hash with the same method and parameters as the real one"""
+    global _dummy_hash
+    _dummy_hash = generate_password_hash(secrets.token_hex(16), method=PASSWORD_HASH.split('$', 1)[0])
+    _dummy_hash_ready.set()
+
+threading.Thread(target=_build_dummy_password_hash, name='dummy-password-hash', daemon=True).start()
+
+def _dummy_password_hash():
+    """Return the dummy hash, waiting for the boot thread only if a login races it"""
+    _dummy_hash_ready.wait()
+    return _dummy_hash
+
 # Initialize security extensions
-Session(app)
 csrf = CSRFProtect(app)
+# Shared storage (e.g. redis://host:6379) keeps counters correct across
+# gunicorn workers; in-memory storage is per-process
+LIMITER_STORAGE_URI = os.environ.get('LIMITER_STORAGE_URI') or os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
 limiter = Limiter(
     key_func=get_remote_address,
     app=app,
-    default_limits=["100 per hour", "20 per minute"]
+    default_limits=["100 per hour", "20 per minute"],
+    storage_uri=LIMITER_STORAGE_URI
 )
 
 # Configuration
@@ -59,82 +84,210 @@ os.makedirs(NOTES_DIR, exist_ok=True)
 # Device trust configuration
 DEVICE_TRUST_DURATION = int(os.environ.get('DEVICE_TRUST_DAYS', 30))  # Days to trust device
 DEVICE_COOKIE_NAME = 'noted_device_id'
+DEVICE_TRUST_COOKIE_NAME = 'noted_device_trust'
+
+# Signs "device_id|fingerprint|expires_ts" so a trusted device proves itself
+# with an HMAC check instead of a search through the trusted devices store
+_trust_signer = TimestampSigner(app.config['SECRET_KEY'], salt='noted-device-trust')
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create session directory in a Railway-compatible location (after logger is defined)
-session_dir = os.path.join(os.path.dirname(__file__), 'flask_session')
-try:
-    os.makedirs(session_dir, exist_ok=True)
-    app.config['SESSION_FILE_DIR'] = session_dir
-    logger.info(f"Session directory created: {session_dir}")
-except Exception as e:
-    logger.warning(f"Could not create session directory, using default: {e}")
-    # Railway will use /tmp if we can't create our own directory
-
 # Device Trust System
+# Pre-seeded hash state; each fingerprint starts from a copy of it
+_FINGERPRINT_PROTO = hashlib.blake2b(b'nmn-fp-v1|', digest_size=32)
+
 def generate_device_fingerprint():
     """Generate a device fingerprint based on request headers and IP"""
-    # Collect device information
-    user_agent = request.headers.get('User-Agent', '')
-    accept_language = request.headers.get('Accept-Language', '')
-    accept_encoding = request.headers.get('Accept-Encoding', '')
-    remote_addr = get_remote_address()
+    # Computed once per request; trust checks and trust creation share it
+    if 'device_fp' in g:
+        return g.device_fp
     
-    # Create fingerprint
-    fingerprint_data = f"{user_agent}|{accept_language}|{accept_encoding}|{remote_addr}"
-    fingerprint_hash = hashlib.sha256(fingerprint_data.encode()).hexdigest()
+    # The fingerprint is only an equality key, so BLAKE2b is used instead of
+    # SHA-256; 32-byte digests keep the stored hex length unchanged
+    fingerprint_hash = _hash_fingerprint_source(_FINGERPRINT_PROTO.copy())
     
+    g.device_fp = fingerprint_hash
     return fingerprint_hash
 
+def _hash_fingerprint_source(h):
+    """Feed the request headers and IP that identify a device into h and return its hex digest"""
+    # Feed each header straight into the hash; WSGI header values are
+    # latin-1 decoded, so encoding them back is lossless
+    headers = request.headers
+    h.update(headers.get('User-Agent', '').encode('latin-1'))
+    h.update(b'|')
+    h.update(headers.get('Accept-Language', '').encode('latin-1'))
+    h.update(b'|')
+    h.update(headers.get('Accept-Encoding', '').encode('latin-1'))
+    h.update(b'|')
+    h.update((request.remote_addr or '127.0.0.1').encode('latin-1'))
+    return h.hexdigest()
+
+def _upgrade_legacy_trust(device_id, fingerprint, by_device_id):
+    """Re-key a trust entry stored with the old SHA-256 fingerprint.
+
+    Returns the upgraded entry, or None if this device has no legacy entry.
+    """
+    legacy_fingerprint = _hash_fingerprint_source(hashlib.sha256())
+    trusted_devices = load_trusted_devices()
+    for key in by_device_id.get(device_id, ()):
+        device_data = trusted_devices.get(key)
+        if device_data and device_data.get('fingerprint') == legacy_fingerprint:
+            del trusted_devices[key]
+            device_data['fingerprint'] = fingerprint
+            trusted_devices[f"{device_id}_{fingerprint[:8]}"] = device_data
+            save_trusted_devices(trusted_devices)
+            logger.info(f"Upgraded trusted device fingerprint: {key}")
+            return device_data
+    return None
+
 def get_device_id():
     """Get or create a unique device ID"""
+    # Memoized so a newly generated ID stays the same for the whole request
+    if 'device_id' in g:
+        return g.device_id
+    
     device_id = request.cookies.get(DEVICE_COOKIE_NAME)
     if not device_id:
         device_id = str(uuid.uuid4())
+    g.device_id = device_id
     return device_id
 
-def load_trusted_devices():
-    """Load trusted devices from JSON file"""
+# Parsed trusted devices, reloaded only when the file's mtime changes, plus an
+# index of device_id -> trust keys so lookups don't scan every entry
+_devices_cache = {'mtime': None, 'data': {}, 'by_device_id': {}}
+_devices_lock = threading.Lock()
+
+def _set_devices_cache(devices, mtime):
+    """Replace the cached devices and rebuild the device_id index (lock held)"""
+    by_device_id = {}
+    for key, device_data in devices.items():
+        by_device_id.setdefault(device_data.get('device_id'), []).append(key)
+    _devices_cache['data'] = devices
+    _devices_cache['by_device_id'] = by_device_id
+    _devices_cache['mtime'] = mtime
+
+def _cached_trusted_devices():
+    """Return the cached (devices, by_device_id) pair, reparsing the file if it changed.
+
+    Both dicts are shared; callers must not mutate them.
+    """
     try:
-        if os.path.exists(TRUSTED_DEVICES_FILE):
-            with open(TRUSTED_DEVICES_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        mtime = os.stat(TRUSTED_DEVICES_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return {}, {}
     except Exception as e:
         logger.error(f"Error loading trusted devices: {e}")
-    return {}
+        return {}, {}
+    
+    with _devices_lock:
+        if _devices_cache['mtime'] != mtime:
+            try:
+                with open(TRUSTED_DEVICES_FILE, 'r', encoding='utf-8') as f:
+                    _set_devices_cache(json.load(f), mtime)
+            except Exception as e:
+                logger.error(f"Error loading trusted devices: {e}")
+                return {}, {}
+        return _devices_cache['data'], _devices_cache['by_device_id']
+
+def load_trusted_devices():
+    """Load trusted devices from JSON file"""
+    devices, _ = _cached_trusted_devices()
+    # Entries are flat dicts, so a two-level copy keeps callers' edits out of the cache
+    return {key: dict(device_data) for key, device_data in devices.items()}
+
+def _atomic_write_json(path, data):
+    """Serialize data once and atomically replace path with it"""
+    # This file is machine-read, so write it compactly; pretty-print only when debugging
+    if app.debug:
+        payload = json.dumps(data, ensure_ascii=False, indent=2)
+    else:
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    payload = payload.encode('utf-8')
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
 
 def save_trusted_devices(devices):
     """Save trusted devices to JSON file"""
     try:
-        with open(TRUSTED_DEVICES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(devices, f, indent=2, ensure_ascii=False)
+        with _devices_lock:
+            _atomic_write_json(TRUSTED_DEVICES_FILE, devices)
+            _set_devices_cache(
+                {key: dict(device_data) for key, device_data in devices.items()},
+                os.stat(TRUSTED_DEVICES_FILE).st_mtime_ns,
+            )
         return True
     except Exception as e:
         logger.error(f"Error saving trusted devices: {e}")
         return False
 
+def _device_expiry_ts(device_data):
+    """Return a trusted device's expiry as an epoch timestamp"""
+    expires_at_ts = device_data.get('expires_at_ts')
+    if expires_at_ts is None:
+        # Entries written before expires_at_ts was stored
+        expires_at_ts = datetime.fromisoformat(device_data['expires_at']).timestamp()
+    return expires_at_ts
+
 def is_device_trusted():
     """Check if current device is trusted"""
     device_id = get_device_id()
     fingerprint = generate_device_fingerprint()
+    # One stat per request keeps revocations made by other workers visible;
+    # the file is only reparsed when it has changed
+    trusted_devices, by_device_id = _cached_trusted_devices()
     
-    trusted_devices = load_trusted_devices()
+    token = request.cookies.get(DEVICE_TRUST_COOKIE_NAME)
+    if token:
+        try:
+            payload = _trust_signer.unsign(token, max_age=DEVICE_TRUST_DURATION * 86400).decode()
+            token_device_id, token_fingerprint, expires_at_ts = payload.split('|')
+            # A valid signed cookie skips the fingerprint and expiry checks
+            # below, but the device must still be in the store
+            if (token_device_id == device_id and token_fingerprint == fingerprint
+                    and time.time() < int(expires_at_ts)
+                    and f"{device_id}_{fingerprint[:8]}" in trusted_devices):
+                return True
+        except (BadSignature, ValueError):
+            pass
     
-    for device_data in trusted_devices.values():
-        if (device_data.get('device_id') == device_id and 
-            device_data.get('fingerprint') == fingerprint):
+    for key in by_device_id.get(device_id, ()):
+        device_data = trusted_devices[key]
+        if device_data.get('fingerprint') == fingerprint:
             
             # Check if trust hasn't expired
-            trust_expiry = parser.parse(device_data.get('expires_at'))
-            if datetime.now() < trust_expiry:
+            expires_at_ts = _device_expiry_ts(device_data)
+            if time.time() < expires_at_ts:
+                if 'expires_at_ts' not in device_data:
+                    # Upgrade the legacy entry so later checks skip the parse
+                    devices = load_trusted_devices()
+                    devices[key]['expires_at_ts'] = expires_at_ts
+                    save_trusted_devices(devices)
                 return True
             else:
                 # Remove expired trust
                 remove_device_trust(device_id)
     
+    if device_id in by_device_id:
+        device_data = _upgrade_legacy_trust(device_id, fingerprint, by_device_id)
+        if device_data is not None:
+            if time.time() < _device_expiry_ts(device_data):
+                return True
+            remove_device_trust(device_id)
+    
     return False
 
 def add_device_trust(device_name=None):
@@ -149,6 +302,7 @@ def add_device_trust(device_name=None):
     if not device_name:
         device_name = f"{device_info['browser']} on {device_info['os']}"
     
+    expires_at = datetime.now() + timedelta(days=DEVICE_TRUST_DURATION)
     trust_data = {
         'device_id': device_id,
         'fingerprint': fingerprint,
@@ -156,7 +310,8 @@ def add_device_trust(device_name=None):
         'user_agent': user_agent,
         'ip_address': get_remote_address(),
         'created_at': datetime.now().isoformat(),
-        'expires_at': (datetime.now() + timedelta(days=DEVICE_TRUST_DURATION)).isoformat(),
+        'expires_at': expires_at.isoformat(),
+        'expires_at_ts': expires_at.timestamp(),
         'last_used': datetime.now().isoformat()
     }
     
@@ -164,8 +319,13 @@ def add_device_trust(device_name=None):
     trust_key = f"{device_id}_{fingerprint[:8]}"
     trusted_devices[trust_key] = trust_data
     
-    # Clean up expired devices while we're here
-    cleanup_expired_devices(trusted_devices)
+    # Picked up by set_device_trust_cookie once the response is built
+    g.device_trust_token = _trust_signer.sign(
+        f"{device_id}|{fingerprint}|{int(trust_data['expires_at_ts'])}"
+    ).decode()
+    
+    # Clean up expired devices while we're here; saved together with the new entry
+    _cleanup_in_place(trusted_devices)
     
     save_trusted_devices(trusted_devices)
     logger.info(f"Added trusted device: {device_name}")
@@ -173,32 +333,29 @@ def add_device_trust(device_name=None):
 
 def remove_device_trust(device_id):
     """Remove device trust"""
-    trusted_devices = load_trusted_devices()
-    
-    # Find and remove device
-    keys_to_remove = []
-    for key, device_data in trusted_devices.items():
-        if device_data.get('device_id') == device_id:
-            keys_to_remove.append(key)
+    _, by_device_id = _cached_trusted_devices()
+    keys_to_remove = by_device_id.get(device_id)
+    if not keys_to_remove:
+        return
     
+    trusted_devices = load_trusted_devices()
     for key in keys_to_remove:
-        del trusted_devices[key]
-        logger.info(f"Removed trusted device: {key}")
+        if trusted_devices.pop(key, None) is not None:
+            logger.info(f"Removed trusted device: {key}")
     
     save_trusted_devices(trusted_devices)
 
-def cleanup_expired_devices(devices_dict=None):
-    """Remove expired trusted devices"""
-    if devices_dict is None:
-        devices_dict = load_trusted_devices()
-    
-    current_time = datetime.now()
+def _cleanup_in_place(devices_dict):
+    """Drop expired or malformed entries from devices_dict without saving.
+
+    Returns True if anything was removed.
+    """
+    current_time = time.time()
     expired_keys = []
     
     for key, device_data in devices_dict.items():
         try:
-            expires_at = parser.parse(device_data.get('expires_at'))
-            if current_time >= expires_at:
+            if current_time >= _device_expiry_ts(device_data):
                 expired_keys.append(key)
         except Exception:
             # Remove malformed entries
@@ -208,50 +365,83 @@ def cleanup_expired_devices(devices_dict=None):
         del devices_dict[key]
     
     if expired_keys:
-        save_trusted_devices(devices_dict)
         logger.info(f"Cleaned up {len(expired_keys)} expired trusted devices")
+    return bool(expired_keys)
 
-def parse_user_agent(user_agent):
-    """Simple user agent parsing for device identification"""
-    ua = user_agent.lower()
+def list_live_trusted_devices(project):
+    """Return project(key, device_data) for each unexpired device, most recently used first.
+
+    Expiry filtering and projection happen in one pass over the cached devices;
+    the store is only rewritten if expired entries were found.
+    """
+    trusted_devices, _ = _cached_trusted_devices()
+    current_time = time.time()
+    devices_list = []
+    expired_keys = []
     
-    # Detect OS
-    if 'windows' in ua:
-        os_name = 'Windows'
-    elif 'mac' in ua or 'darwin' in ua:
-        os_name = 'macOS'
-    elif 'linux' in ua:
-        os_name = 'Linux'
-    elif 'android' in ua:
-        os_name = 'Android'
-    elif 'iphone' in ua or 'ipad' in ua:
-        os_name = 'iOS'
-    else:
-        os_name = 'Unknown'
-    
-    # Detect browser
-    if 'chrome' in ua and 'edg' not in ua:
-        browser = 'Chrome'
-    elif 'firefox' in ua:
-        browser = 'Firefox'
-    elif 'safari' in ua and 'chrome' not in ua:
-        browser = 'Safari'
-    elif 'edg' in ua:
-        browser = 'Edge'
-    else:
-        browser = 'Unknown'
+    for key, device_data in trusted_devices.items():
+        try:
+            live = current_time < _device_expiry_ts(device_data)
+        except Exception:
+            live = False  # Malformed entries are dropped like expired ones
+        if live:
+            devices_list.append(project(key, device_data))
+        else:
+            expired_keys.append(key)
+    
+    if expired_keys:
+        devices = load_trusted_devices()
+        for key in expired_keys:
+            devices.pop(key, None)
+        save_trusted_devices(devices)
+        logger.info(f"Cleaned up {len(expired_keys)} expired trusted devices")
     
+    devices_list.sort(key=operator.itemgetter('last_used'), reverse=True)
+    return devices_list
+
+# First matching token wins, so more specific platforms come before the
+# generic ones they embed (Android UAs contain "Linux", iOS ones "Mac OS X")
+_UA_OS_TOKENS = (
+    ('windows', 'Windows'),
+    ('android', 'Android'),
+    ('iphone', 'iOS'),
+    ('ipad', 'iOS'),
+    ('mac', 'macOS'),
+    ('darwin', 'macOS'),
+    ('linux', 'Linux'),
+)
+# Edge UAs also contain "chrome", and Chrome UAs contain "safari"
+_UA_BROWSER_TOKENS = (
+    ('edg', 'Edge'),
+    ('chrome', 'Chrome'),
+    ('firefox', 'Firefox'),
+    ('safari', 'Safari'),
+)
+
+@lru_cache(maxsize=256)
+def _classify_user_agent(user_agent):
+    """Return (os_name, browser) for a user agent; clients repeat the same UA"""
+    ua = user_agent.lower()
+    os_name = next((name for token, name in _UA_OS_TOKENS if token in ua), 'Unknown')
+    browser = next((name for token, name in _UA_BROWSER_TOKENS if token in ua), 'Unknown')
+    return os_name, browser
+
+def parse_user_agent(user_agent):
+    """Simple user agent parsing for device identification"""
+    os_name, browser = _classify_user_agent(user_agent)
     return {'os': os_name, 'browser': browser}
 
 def update_device_last_used(device_id):
     """Update last used timestamp for trusted device"""
-    trusted_devices = load_trusted_devices()
+    _, by_device_id = _cached_trusted_devices()
+    keys = by_device_id.get(device_id)
+    if not keys:
+        return
     
-    for device_data in trusted_devices.values():
-        if device_data.get('device_id') == device_id:
-            device_data['last_used'] = datetime.now().isoformat()
-            save_trusted_devices(trusted_devices)
-            break
+    trusted_devices = load_trusted_devices()
+    if keys[0] in trusted_devices:
+        trusted_devices[keys[0]]['last_used'] = datetime.now().isoformat()
+        save_trusted_devices(trusted_devices)
 
 # Security headers middleware
 @app.after_request
@@ -264,6 +454,21 @@ def add_security_headers(response):
     response.headers['Content-Security-Policy'] = "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline'"
     return response
 
+@app.after_request
+def set_device_trust_cookie(response):
+    """Attach the signed trust cookie issued by add_device_trust, if any"""
+    token = g.pop('device_trust_token', None)
+    if token:
+        response.set_cookie(
+            DEVICE_TRUST_COOKIE_NAME,
+            token,
+            max_age=DEVICE_TRUST_DURATION * 24 * 60 * 60,
+            secure=request.is_secure,
+            httponly=True,
+            samesite='Lax'
+        )
+    return response
+
 # Authentication decorator
 def login_required(f):
     """Decorator to require authentication for routes"""
@@ -323,7 +528,9 @@ def login():
             password = data.get('password', '')
             remember_device = data.get('remember_device', False)
             
-            if username == USERNAME and PASSWORD_HASH and check_password_hash(PASSWORD_HASH, password):
+            user_ok = hmac.compare_digest(username.encode(), USERNAME.encode())
+            password_ok = check_password_hash(PASSWORD_HASH if user_ok else _dummy_password_hash(), password)
+            if user_ok and password_ok:
                 # Set session
                 session['authenticated'] = True
                 session['username'] = username
@@ -389,21 +596,16 @@ def logout():
 @login_required
 def manage_devices():
     """Device management page"""
-    trusted_devices = load_trusted_devices()
     current_device_id = session.get('device_id') or get_device_id()
     
-    # Clean up expired devices
-    cleanup_expired_devices(trusted_devices)
+    def project(key, device_data):
+        device_info = dict(device_data)
+        device_info['key'] = key
+        device_info['is_current'] = device_data.get('device_id') == current_device_id
+        device_info.setdefault('last_used', '')
+        return device_info
     
-    # Prepare device list for display
-    devices_list = []
-    for key, device_data in trusted_devices.items():
-        device_data['key'] = key
-        device_data['is_current'] = device_data.get('device_id') == current_device_id
-        devices_list.append(device_data)
-    
-    # Sort by last used (most recent first)
-    devices_list.sort(key=lambda x: x.get('last_used', ''), reverse=True)
+    devices_list = list_live_trusted_devices(project)
     
     return render_template('devices.html', devices=devices_list, current_device_id=current_device_id)
 
@@ -412,25 +614,20 @@ def manage_devices():
 def get_trusted_devices():
     """Get list of trusted devices"""
     try:
-        trusted_devices = load_trusted_devices()
         current_device_id = session.get('device_id') or get_device_id()
         
-        cleanup_expired_devices(trusted_devices)
-        
-        devices_list = []
-        for key, device_data in trusted_devices.items():
-            device_info = {
+        def project(key, device_data):
+            return {
                 'key': key,
                 'name': device_data.get('name', 'Unknown Device'),
                 'created_at': device_data.get('created_at'),
-                'last_used': device_data.get('last_used'),
+                'last_used': device_data.get('last_used', ''),
                 'expires_at': device_data.get('expires_at'),
                 'ip_address': device_data.get('ip_address'),
                 'is_current': device_data.get('device_id') == current_device_id
             }
-            devices_list.append(device_info)
         
-        devices_list.sort(key=lambda x: x.get('last_used', ''), reverse=True)
+        devices_list = list_live_trusted_devices(project)
         
         return jsonify({'success': True, 'devices': devices_list})
     except Exception as e:
@@ -483,11 +680,11 @@ def trust_current_device():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 def get_notes_file():
-    """Get the path to the notes JSON file"""
+    """Get the path to the legacy notes JSON file"""
     return os.path.join(NOTES_DIR, 'notes.json')
 
 def load_notes():
-    """Load all notes from JSON file"""
+    """Load all notes from the legacy JSON file"""
     try:
         notes_file = get_notes_file()
         if os.path.exists(notes_file):
@@ -497,16 +694,77 @@ def load_notes():
         logger.error(f"Error loading notes: {e}")
     return {}
 
-def save_notes(notes):
-    """Save all notes to JSON file"""
+# Notes live in SQLite so each request touches only the rows it needs instead
+# of re-reading and rewriting the whole notes.json
+NOTES_DB_FILE = os.path.join(NOTES_DIR, 'notes.db')
+NOTE_COLUMNS = 'id, text, created, modified, owner'
+_notes_local = threading.local()
+
+def _connect_notes_db():
+    """Open a connection to the notes database in WAL mode"""
+    conn = sqlite3.connect(NOTES_DB_FILE)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+def get_notes_db():
+    """Get this thread's connection to the notes database"""
+    conn = getattr(_notes_local, 'conn', None)
+    if conn is None:
+        conn = _notes_local.conn = _connect_notes_db()
+    return conn
+
+def init_notes_db():
+    """Create the notes table and import notes.json from earlier versions"""
+    # Uses a throwaway connection so no connection is shared across forked workers
+    conn = _connect_notes_db()
     try:
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS notes ('
+                'id TEXT PRIMARY KEY, text TEXT, created TEXT, modified TEXT, owner TEXT)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS notes_modified ON notes(modified)')
+            # Single-row counter bumped with every change; shared by all workers
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS notes_meta ('
+                'id INTEGER PRIMARY KEY CHECK (id = 0), version INTEGER NOT NULL)'
+            )
+            conn.execute('INSERT OR IGNORE INTO notes_meta (id, version) VALUES (0, 0)')
+        
         notes_file = get_notes_file()
-        with open(notes_file, 'w', encoding='utf-8') as f:
-            json.dump(notes, f, indent=2, ensure_ascii=False)
-        return True
-    except Exception as e:
-        logger.error(f"Error saving notes: {e}")
-        return False
+        if os.path.exists(notes_file):
+            notes = load_notes()
+            with conn:
+                conn.executemany(
+                    f'INSERT OR IGNORE INTO notes ({NOTE_COLUMNS}) VALUES (?, ?, ?, ?, ?)',
+                    [(note_id, note.get('text', ''), note.get('created'), note.get('modified'), note.get('owner'))
+                     for note_id, note in notes.items()]
+                )
+                bump_notes_version(conn)
+            # Keep the old file around, but never import it twice
+            try:
+                os.replace(notes_file, notes_file + '.migrated')
+                logger.info(f"Migrated {len(notes)} notes from {notes_file} to {NOTES_DB_FILE}")
+            except OSError:
+                pass  # Another worker already moved it
+    finally:
+        conn.close()
+
+def bump_notes_version(conn):
+    """Mark the notes as changed; call inside the mutating transaction"""
+    conn.execute('UPDATE notes_meta SET version = version + 1 WHERE id = 0')
+
+# (version, serialized GET /api/notes body) for the last version served
+_notes_body_cache = (None, b'')
+
+def get_note_row(note_id):
+    """Fetch a single note as a dict, or None if it doesn't exist"""
+    row = get_notes_db().execute(f'SELECT {NOTE_COLUMNS} FROM notes WHERE id = ?', (note_id,)).fetchone()
+    return dict(row) if row else None
+
+init_notes_db()
 
 @app.route('/health')
 def health_check():
@@ -533,7 +791,6 @@ def debug_info():
             'NOTED_USERNAME': 'SET' if os.environ.get('NOTED_USERNAME') else 'NOT_SET',
             'NOTED_PASSWORD_HASH': 'SET' if os.environ.get('NOTED_PASSWORD_HASH') else 'NOT_SET'
         },
-        'session_dir': app.config.get('SESSION_FILE_DIR', 'default'),
         'notes_dir': NOTES_DIR
     })
 
@@ -548,16 +805,33 @@ def index():
 @limiter.limit("30 per minute")
 def get_notes():
     """Get all notes"""
+    global _notes_body_cache
     try:
-        notes = load_notes()
-        # Convert to list and sort by modified date
-        notes_list = []
-        for note_id, note_data in notes.items():
-            note_data['id'] = note_id
-            notes_list.append(note_data)
-        
-        notes_list.sort(key=lambda x: x.get('modified', ''), reverse=True)
-        return jsonify({'success': True, 'notes': notes_list})
+        conn = get_notes_db()
+        version = conn.execute('SELECT version FROM notes_meta WHERE id = 0').fetchone()[0]
+        etag = f'notes-{version}'
+        
+        # Unchanged since the client's last poll: skip the query and serialization
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+        
+        cached_version, body = _notes_body_cache
+        if cached_version != version:
+            # Read the version and rows from one snapshot so the body matches its ETag
+            with conn:
+                conn.execute('BEGIN')
+                version = conn.execute('SELECT version FROM notes_meta WHERE id = 0').fetchone()[0]
+                rows = conn.execute(f'SELECT {NOTE_COLUMNS} FROM notes ORDER BY modified DESC').fetchall()
+            notes_list = [dict(row) for row in rows]
+            body = jsonify({'success': True, 'notes': notes_list}).get_data()
+            _notes_body_cache = (version, body)
+            etag = f'notes-{version}'
+        
+        response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag, weak=True)
+        return response
     except Exception as e:
         logger.error(f"Error getting notes: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -582,14 +856,19 @@ def create_note():
             'owner': session.get('username', 'anonymous')
         }
         
-        notes = load_notes()
-        notes[note_id] = note_data
-        
-        if save_notes(notes):
-            note_data['id'] = note_id
-            return jsonify({'success': True, 'note': note_data})
-        else:
+        try:
+            with get_notes_db() as conn:
+                conn.execute(
+                    f'INSERT INTO notes ({NOTE_COLUMNS}) VALUES (?, ?, ?, ?, ?)',
+                    (note_id, note_data['text'], timestamp, timestamp, note_data['owner'])
+                )
+                bump_notes_version(conn)
+        except sqlite3.Error as e:
+            logger.error(f"Error saving note: {e}")
             return jsonify({'success': False, 'error': 'Failed to save note'}), 500
+        
+        note_data['id'] = note_id
+        return jsonify({'success': True, 'note': note_data})
     except Exception as e:
         logger.error(f"Error creating note: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -604,23 +883,30 @@ def update_note(note_id):
         validate_csrf(request.headers.get('X-CSRFToken'))
         
         data = request.get_json()
-        notes = load_notes()
+        note = get_note_row(note_id)
         
-        if note_id not in notes:
+        if note is None:
             return jsonify({'success': False, 'error': 'Note not found'}), 404
         
         # Check ownership (optional: remove if you want shared notes)
-        if notes[note_id].get('owner') != session.get('username') and session.get('username') != USERNAME:
+        if note.get('owner') != session.get('username') and session.get('username') != USERNAME:
             return jsonify({'success': False, 'error': 'Access denied'}), 403
         
-        notes[note_id]['text'] = data.get('text', notes[note_id]['text'])
-        notes[note_id]['modified'] = datetime.now().isoformat()
+        note['text'] = data.get('text', note['text'])
+        note['modified'] = datetime.now().isoformat()
         
-        if save_notes(notes):
-            notes[note_id]['id'] = note_id
-            return jsonify({'success': True, 'note': notes[note_id]})
-        else:
+        try:
+            with get_notes_db() as conn:
+                conn.execute(
+                    'UPDATE notes SET text = ?, modified = ? WHERE id = ?',
+                    (note['text'], note['modified'], note_id)
+                )
+                bump_notes_version(conn)
+        except sqlite3.Error as e:
+            logger.error(f"Error saving note: {e}")
             return jsonify({'success': False, 'error': 'Failed to save note'}), 500
+        
+        return jsonify({'success': True, 'note': note})
     except Exception as e:
         logger.error(f"Error updating note: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -634,21 +920,24 @@ def delete_note(note_id):
         # Validate CSRF for API requests
         validate_csrf(request.headers.get('X-CSRFToken'))
         
-        notes = load_notes()
+        note = get_note_row(note_id)
         
-        if note_id not in notes:
+        if note is None:
             return jsonify({'success': False, 'error': 'Note not found'}), 404
         
         # Check ownership (optional: remove if you want shared notes)
-        if notes[note_id].get('owner') != session.get('username') and session.get('username') != USERNAME:
+        if note.get('owner') != session.get('username') and session.get('username') != USERNAME:
             return jsonify({'success': False, 'error': 'Access denied'}), 403
         
-        del notes[note_id]
-        
-        if save_notes(notes):
-            return jsonify({'success': True})
-        else:
+        try:
+            with get_notes_db() as conn:
+                conn.execute('DELETE FROM notes WHERE id = ?', (note_id,))
+                bump_notes_version(conn)
+        except sqlite3.Error as e:
+            logger.error(f"Error deleting note: {e}")
             return jsonify({'success': False, 'error': 'Failed to delete note'}), 500
+        
+        return jsonify({'success': True})
     except Exception as e:
         logger.error(f"Error deleting note: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -6,13 +6,18 @@ Adapted from desktop/mobile versions with web-specific optimizations.
 
 import msal
 import requests
+from requests.adapters import HTTPAdapter
+import base64
 import json
 import os
 import time
 import hashlib
 import logging
+from collections import namedtuple
+from collections.abc import MutableMapping
 from threading import Thread, Lock
 from datetime import datetime
+from urllib.parse import quote
 from flask import session as flask_session
 
 # Configure logging
@@ -27,6 +32,23 @@ SCOPES = ["Files.ReadWrite.AppFolder", "User.Read"]
 # API Endpoint for the app's special folder in the user's OneDrive
 GRAPH_API_ENDPOINT = "https://graph.microsoft.com/v1.0/me/drive/special/approot"
 
+# Read-only view of a device flow's timing, taken under the flow's lock
+FlowSnapshot = namedtuple('FlowSnapshot', 'started_at timeout completed original extended')
+
+# When set, device flows live in Redis so any worker can answer a poll
+REDIS_URL = os.environ.get("REDIS_URL")
+
+# Default seconds between device flow polls when Microsoft doesn't say (RFC 8628)
+DEVICE_FLOW_INTERVAL = 5
+
+# Connections kept open per host; request threads and the sync worker share them
+HTTP_POOL_SIZE = 10
+
+# Microsoft Graph accepts at most 20 requests per JSON batch
+GRAPH_BATCH_SIZE = 20
+# Attempts for throttled batch sub-requests, backing off 1s, 2s, 4s...
+GRAPH_BATCH_ATTEMPTS = 3
+
 # For Railway deployment, store token cache in a persistent location
 # Railway containers are ephemeral, but we can use session storage
 IS_RAILWAY = os.environ.get('RAILWAY_ENVIRONMENT') is not None
@@ -38,6 +60,44 @@ else:
     # Local development
     TOKEN_CACHE_FILE = os.path.join(os.path.dirname(__file__), "web_notes", "onedrive_token_cache.json")
 
+class RedisFlowMap(MutableMapping):
+    """
+    Device flows stored in Redis, one JSON value per session, so polls
+    reach the same flow whichever worker serves them. Values are copies:
+    write a flow back after changing it.
+    """
+    
+    KEY_PREFIX = "noted:device_flow:"
+    
+    def __init__(self, client):
+        self._redis = client
+    
+    def __getitem__(self, session_id):
+        raw = self._redis.get(self.KEY_PREFIX + session_id)
+        if raw is None:
+            raise KeyError(session_id)
+        return json.loads(raw)
+    
+    def __setitem__(self, session_id, flow_data):
+        # Keep the flow a while past its polling window so late polls still see the outcome
+        timeout = flow_data.get("extended_expires_in", flow_data["flow"].get("expires_in", 2700))
+        ttl = int(flow_data["started_at"] + timeout - time.time()) + 600
+        self._redis.set(self.KEY_PREFIX + session_id, json.dumps(flow_data), ex=max(ttl, 1))
+    
+    def __delitem__(self, session_id):
+        if not self._redis.delete(self.KEY_PREFIX + session_id):
+            raise KeyError(session_id)
+    
+    def __iter__(self):
+        for key in self._redis.scan_iter(match=self.KEY_PREFIX + "*"):
+            if isinstance(key, bytes):
+                key = key.decode()
+            yield key[len(self.KEY_PREFIX):]
+    
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
 class WebOneDriveManager:
     """
     OneDrive Manager optimized for Flask web applications.
@@ -63,10 +123,16 @@ class WebOneDriveManager:
             # Load existing token cache (Railway-aware)
             self._load_token_cache()
 
+            # One keep-alive session for Graph and MSAL, so repeated calls
+            # reuse open TLS connections instead of handshaking each time
+            self._http = requests.Session()
+            self._http.mount("https://", HTTPAdapter(pool_maxsize=HTTP_POOL_SIZE))
+
             self.app = msal.PublicClientApplication(
                 CLIENT_ID,
                 authority=AUTHORITY,
-                token_cache=self._token_cache
+                token_cache=self._token_cache,
+                http_client=self._http
             )
             
             if not self.app:
@@ -76,7 +142,16 @@ class WebOneDriveManager:
             
             self.account = None
             self.access_token = None
-            self._auth_flows = {}  # Store active auth flows by session ID
+            # Store active auth flows by session ID
+            if REDIS_URL:
+                import redis
+                self._auth_flows = RedisFlowMap(redis.Redis.from_url(REDIS_URL))
+                logger.info("Device flows stored in Redis")
+            else:
+                self._auth_flows = {}
+            # Striped locks for reading and extending flows: one session's
+            # requests serialize, unrelated sessions rarely share a stripe
+            self._flow_locks = [Lock() for _ in range(64)]
             
             # Try to restore authentication state from Flask session
             if self._use_session_storage:
@@ -93,14 +168,6 @@ class WebOneDriveManager:
     def _load_token_cache(self):
         """Load token cache from persistent storage."""
         try:
-            # On Railway, try Flask session first
-            if self._use_session_storage and 'onedrive_token_cache' in flask_session:
-                token_data = flask_session['onedrive_token_cache']
-                if token_data:
-                    self._token_cache.deserialize(token_data)
-                    logger.info("✅ Token cache loaded from Flask session")
-                    return
-            
             # Try environment variable (for Railway persistence)
             token_data = os.environ.get('ONEDRIVE_TOKEN_CACHE')
             if token_data:
@@ -126,13 +193,8 @@ class WebOneDriveManager:
                 with self._cache_lock:
                     token_data = self._token_cache.serialize()
                     
-                    # On Railway, save to Flask session for better persistence
-                    if self._use_session_storage and token_data:
-                        flask_session['onedrive_token_cache'] = token_data
-                        flask_session.permanent = True  # Make session persist longer
-                        logger.info("✅ Token cache saved to Flask session")
-                    
-                    # Always try to save to file (for local development)
+                    # Always save to file; the cache is not kept in the Flask session,
+                    # which is a signed cookie that a serialized cache would overflow
                     try:
                         os.makedirs(os.path.dirname(TOKEN_CACHE_FILE), exist_ok=True)
                         with open(TOKEN_CACHE_FILE, "w") as f:
@@ -158,10 +220,6 @@ class WebOneDriveManager:
                 account_data = flask_session['onedrive_account']
                 # The account will be restored from token cache when needed
                 logger.info("📱 OneDrive account data found in session")
-            
-            # Check if we have valid tokens in session
-            if 'onedrive_token_cache' in flask_session:
-                logger.info("🔐 OneDrive token cache found in session - authentication should be restored")
                 
         except Exception as e:
             logger.warning(f"Failed to restore OneDrive session: {e}")
@@ -170,7 +228,6 @@ class WebOneDriveManager:
         """Clear OneDrive authentication from Flask session."""
         try:
             if self._use_session_storage:
-                flask_session.pop('onedrive_token_cache', None)
                 flask_session.pop('onedrive_account', None)
                 logger.info("🧹 Cleared OneDrive authentication from session")
                 
@@ -184,6 +241,8 @@ class WebOneDriveManager:
                     accounts = self.app.get_accounts()
                     for account in accounts:
                         self.app.remove_account(account)
+                    # The cache lives in the token file, not the session
+                    self._save_cache()
                 
                 return True
         except Exception as e:
@@ -294,11 +353,10 @@ class WebOneDriveManager:
         Check the status of device flow authentication.
         Returns authentication status and result.
         """
-        if session_id not in self._auth_flows:
+        flow_data = self._auth_flows.get(session_id)
+        if flow_data is None:
             return {"status": "not_found", "message": "No authentication flow found"}
         
-        flow_data = self._auth_flows[session_id]
-        
         if flow_data["completed"]:
             return flow_data["result"]
         
@@ -307,11 +365,11 @@ class WebOneDriveManager:
             elapsed_time = time.time() - flow_data["started_at"]
             timeout = flow_data.get("extended_expires_in", flow_data["flow"].get("expires_in", 2700))
             
-            logger.info(f"🕐 Device flow check: {elapsed_time:.0f}s elapsed, timeout is {timeout}s ({timeout/60:.1f}min)")
+            logger.debug("🕐 Device flow check: %.0fs elapsed, timeout is %ss (%.1fmin)", elapsed_time, timeout, timeout / 60)
             
             if elapsed_time > timeout:
                 logger.warning(f"🕐 Device flow expired after {elapsed_time:.0f}s (timeout: {timeout}s)")
-                del self._auth_flows[session_id]
+                self._auth_flows.pop(session_id, None)
                 return {"status": "expired", "message": f"Authentication flow expired after {timeout/60:.1f} minutes"}
             
             # Try to complete the device flow with timeout protection
@@ -351,7 +409,10 @@ class WebOneDriveManager:
                     return {"status": "pending", "message": "Authentication check in progress..."}
                 
                 # For other MSAL errors that indicate still pending
-                if "authorization_pending" in str(e).lower() or "slow_down" in str(e).lower():
+                if "slow_down" in str(e).lower():
+                    self._slow_down(session_id)
+                    return {"status": "pending", "message": "Waiting for user to complete authentication..."}
+                if "authorization_pending" in str(e).lower():
                     return {"status": "pending", "message": "Waiting for user to complete authentication..."}
                     
                 raise e
@@ -374,38 +435,96 @@ class WebOneDriveManager:
                     except Exception as e:
                         logger.warning(f"Failed to save account to session: {e}")
                 
-                # Mark as completed
-                flow_data["completed"] = True
-                flow_data["result"] = {"status": "success", "message": "Authentication successful"}
-                
                 logger.info("OneDrive: Web authentication successful")
-                return flow_data["result"]
+                return self._finish_flow(session_id, flow_data, {"status": "success", "message": "Authentication successful"})
             
             elif "error" in result:
                 if result["error"] == "authorization_pending":
                     return {"status": "pending", "message": "Waiting for user authorization"}
                 elif result["error"] == "slow_down":
+                    self._slow_down(session_id)
                     return {"status": "pending", "message": "Slow down polling"}
                 else:
                     error_msg = result.get("error_description", result["error"])
-                    flow_data["completed"] = True
-                    flow_data["result"] = {"status": "error", "message": f"Authentication failed: {error_msg}"}
-                    return flow_data["result"]
+                    return self._finish_flow(session_id, flow_data, {"status": "error", "message": f"Authentication failed: {error_msg}"})
             
             return {"status": "pending", "message": "Authentication in progress"}
             
         except Exception as e:
             logger.error(f"OneDrive: Device flow status check failed: {e}")
-            flow_data["completed"] = True
-            flow_data["result"] = {"status": "error", "message": f"Authentication error: {str(e)}"}
-            return flow_data["result"]
+            return self._finish_flow(session_id, flow_data, {"status": "error", "message": f"Authentication error: {str(e)}"})
+
+    def _finish_flow(self, session_id, flow_data, result):
+        """Record a device flow's final result and return it."""
+        flow_data["completed"] = True
+        flow_data["result"] = result
+        # Write back so Redis-backed flows see the change too
+        self._auth_flows[session_id] = flow_data
+        return result
+
+    def _flow_lock(self, session_id):
+        """Return the lock guarding session_id's entry in _auth_flows."""
+        return self._flow_locks[hash(session_id) & 63]
+
+    def get_flow_snapshot(self, session_id):
+        """Return a FlowSnapshot of the session's device flow, or None if it has none."""
+        with self._flow_lock(session_id):
+            flow_data = self._auth_flows.get(session_id)
+            if flow_data is None:
+                return None
+            return FlowSnapshot(
+                started_at=flow_data["started_at"],
+                timeout=flow_data.get("extended_expires_in", flow_data["flow"].get("expires_in", 2700)),
+                completed=flow_data.get("completed", False),
+                original=flow_data.get("original_expires_in", "unknown"),
+                extended=flow_data.get("extended_expires_in", "unknown")
+            )
+
+    def extend_device_flow(self, session_id, additional_time):
+        """Add additional_time seconds to the session's device flow timeout.
+        Returns the new timeout, or None if the session has no flow."""
+        with self._flow_lock(session_id):
+            flow_data = self._auth_flows.get(session_id)
+            if flow_data is None:
+                return None
+            current_timeout = flow_data.get("extended_expires_in", flow_data["flow"].get("expires_in", 2700))
+            new_timeout = current_timeout + additional_time
+            flow_data["extended_expires_in"] = new_timeout
+            flow_data["flow"]["expires_in"] = new_timeout
+            self._auth_flows[session_id] = flow_data
+            return new_timeout
+
+    def current_interval(self, session_id):
+        """Return the seconds to wait between polls of the session's device flow."""
+        flow_data = self._auth_flows.get(session_id)
+        if flow_data is None:
+            return DEVICE_FLOW_INTERVAL
+        return flow_data.get("interval", flow_data["flow"].get("interval", DEVICE_FLOW_INTERVAL))
+
+    def _slow_down(self, session_id):
+        """Lengthen the session's poll interval after a slow_down response.
+        Each slow_down adds 5 seconds, as the device flow spec requires; the
+        first one also stretches the interval by 40% for the rest of the flow."""
+        with self._flow_lock(session_id):
+            flow_data = self._auth_flows.get(session_id)
+            if flow_data is None:
+                return
+            interval = flow_data.get("interval", flow_data["flow"].get("interval", DEVICE_FLOW_INTERVAL)) + 5
+            if not flow_data.get("slowed_down"):
+                interval *= 1.4
+                flow_data["slowed_down"] = True
+            flow_data["interval"] = interval
+            self._auth_flows[session_id] = flow_data
+            logger.info(f"🕐 Device flow slow_down: polling every {interval:.0f}s")
+
+    def active_flow_sessions(self):
+        """Return the session IDs that have a device flow in progress."""
+        return list(self._auth_flows)
 
     def cancel_device_flow(self, session_id):
         """Cancel an active device flow."""
-        if session_id in self._auth_flows:
-            del self._auth_flows[session_id]
-            return True
-        return False
+        with self._flow_lock(session_id):
+            return self._auth_flows.pop(session_id, None) is not None
 
     def logout(self):
         """Clear authentication and remove cached tokens."""
@@ -450,18 +569,18 @@ class WebOneDriveManager:
             request_timeout = 15 if IS_RAILWAY else 30
             
             if method.upper() == "GET":
-                response = requests.get(url, headers=request_headers, timeout=request_timeout)
+                response = self._http.get(url, headers=request_headers, timeout=request_timeout)
             elif method.upper() == "POST":
-                response = requests.post(url, headers=request_headers, json=data, timeout=request_timeout)
+                response = self._http.post(url, headers=request_headers, json=data, timeout=request_timeout)
             elif method.upper() == "PUT":
                 if isinstance(data, str):
                     # For content uploads
                     request_headers["Content-Type"] = "application/json"
-                    response = requests.put(url, headers=request_headers, data=data, timeout=request_timeout)
+                    response = self._http.put(url, headers=request_headers, data=data, timeout=request_timeout)
                 else:
-                    response = requests.put(url, headers=request_headers, json=data, timeout=request_timeout)
+                    response = self._http.put(url, headers=request_headers, json=data, timeout=request_timeout)
             elif method.upper() == "DELETE":
-                response = requests.delete(url, headers=request_headers, timeout=request_timeout)
+                response = self._http.delete(url, headers=request_headers, timeout=request_timeout)
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
 
@@ -498,6 +617,7 @@ class WebOneDriveManager:
                         "name": file["name"],
                         "modified": file["lastModifiedDateTime"],
                         "size": file["size"],
+                        "etag": file.get("eTag"),
                         "download_url": file.get("@microsoft.graph.downloadUrl")
                     })
             
@@ -534,6 +654,18 @@ class WebOneDriveManager:
         """Get the content of a specific note by its OneDrive item ID. Matches desktop interface."""
         return self.get_note(item_id)
 
+    @staticmethod
+    def _note_upload(file_name, content_dict):
+        """
+        Return the (endpoint, content) pair for uploading a note file.
+        Single and batched saves share it so both write the same bytes.
+        """
+        # Ensure file_name ends with .json
+        if not file_name.endswith(".json"):
+            file_name += ".json"
+        endpoint = f"/me/drive/special/approot:/{quote(file_name)}:/content"
+        return endpoint, json.dumps(content_dict, indent=2)
+
     def save_note(self, file_name, content_dict):
         """
         Save a note to OneDrive. Creates or overwrites the file.
@@ -541,17 +673,9 @@ class WebOneDriveManager:
         Compatible with desktop version format.
         """
         try:
-            # Ensure file_name ends with .json
-            if not file_name.endswith(".json"):
-                file_name += ".json"
-            
-            content = json.dumps(content_dict, indent=2)
+            endpoint, content = self._note_upload(file_name, content_dict)
             
-            response = self._make_graph_request(
-                "PUT",
-                f"/me/drive/special/approot:/{file_name}:/content",
-                data=content
-            )
+            response = self._make_graph_request("PUT", endpoint, data=content)
                 
             result = response.json()
             logger.info(f"OneDrive: Note saved successfully: {result.get('name', 'unknown')}")
@@ -561,6 +685,70 @@ class WebOneDriveManager:
             logger.error(f"OneDrive: Failed to save note: {e}")
             return None
 
+    def batch_upload(self, items):
+        """
+        Save several notes through Graph JSON batching, 20 per round trip.
+        items is a list of (file_name, content_dict) pairs; returns the saved
+        OneDrive IDs in the same order, with None for notes that failed.
+        Throttled (429/503) sub-requests are retried with exponential backoff.
+        """
+        saved_ids = [None] * len(items)
+        pending = list(range(len(items)))
+        delay = 1
+        
+        for attempt in range(GRAPH_BATCH_ATTEMPTS):
+            throttled = []
+            retry_after = 0
+            
+            for start in range(0, len(pending), GRAPH_BATCH_SIZE):
+                chunk = pending[start:start + GRAPH_BATCH_SIZE]
+                requests_payload = []
+                for index in chunk:
+                    endpoint, content = self._note_upload(*items[index])
+                    # A JSON-typed body would be re-serialized by Graph, so the
+                    # file text is sent as base64 to keep save_note's format
+                    requests_payload.append({
+                        "id": str(index),
+                        "method": "PUT",
+                        "url": endpoint,
+                        "body": base64.b64encode(content.encode("utf-8")).decode("ascii"),
+                        "headers": {"Content-Type": "application/octet-stream"}
+                    })
+                
+                try:
+                    response = self._make_graph_request("POST", "/$batch", data={"requests": requests_payload})
+                    responses = response.json().get("responses", [])
+                except Exception as e:
+                    logger.error(f"OneDrive: Batch upload request failed: {e}")
+                    continue
+                
+                for sub_response in responses:
+                    index = int(sub_response["id"])
+                    status = sub_response.get("status")
+                    if status in (200, 201):
+                        saved_ids[index] = (sub_response.get("body") or {}).get("id")
+                    elif status in (429, 503):
+                        throttled.append(index)
+                        try:
+                            retry_after = max(retry_after, int(sub_response.get("headers", {}).get("Retry-After", 0)))
+                        except (TypeError, ValueError):
+                            pass
+                    else:
+                        logger.error(f"OneDrive: Batch save of {items[index][0]} failed: {status} - {sub_response.get('body')}")
+            
+            if not throttled or attempt == GRAPH_BATCH_ATTEMPTS - 1:
+                if throttled:
+                    logger.error(f"OneDrive: {len(throttled)} notes still throttled after {GRAPH_BATCH_ATTEMPTS} attempts")
+                break
+            
+            logger.info(f"OneDrive: Retrying {len(throttled)} throttled notes in {max(delay, retry_after)}s")
+            time.sleep(max(delay, retry_after))
+            delay *= 2
+            pending = throttled
+        
+        logger.info(f"OneDrive: Batch saved {sum(1 for saved_id in saved_ids if saved_id)}/{len(items)} notes")
+        return saved_ids
+
     def delete_note(self, note_id):
         """Delete a note from OneDrive."""
         try:
@@ -615,6 +803,9 @@ class WebOneDriveManager:
             
             synced_notes = {}
             sync_stats = {"created": 0, "updated": 0, "errors": 0, "duplicates_avoided": 0}
+            synced_at = datetime.now().isoformat()  # One timestamp for the whole sync
+            uploads = {}  # filename -> cloud note data; a later note for the same file wins
+            planned = []  # (note_id, note_data, filename, stat key) in local order
             
             for note_id, note_data in local_notes.items():
                 try:
@@ -638,18 +829,14 @@ class WebOneDriveManager:
                         "text": note_text,          # Web format
                         "content": note_text,       # Desktop format
                         "web_note_id": note_id,
-                        "synced_at": datetime.now().isoformat(),
+                        "synced_at": synced_at,
                         "source": "web_app"        # Mark as coming from web app
                     }
                     
                     if existing_filename:
                         # Update existing note (either exact match or duplicate)
-                        saved_id = self.save_note(existing_filename, cloud_note_data)
-                        if saved_id:
-                            note_data["onedrive_id"] = saved_id
-                            sync_stats["updated"] += 1
-                        else:
-                            sync_stats["errors"] += 1
+                        uploads[existing_filename] = cloud_note_data
+                        planned.append((note_id, note_data, existing_filename, "updated"))
                     else:
                         # Create new note with descriptive filename based on title
                         title = note_data.get("title", "").strip()
@@ -662,18 +849,14 @@ class WebOneDriveManager:
                             # Fallback to timestamp-based filename
                             new_filename = f"web_note_{note_id}_{int(time.time())}.json"
                         
-                        saved_id = self.save_note(new_filename, cloud_note_data)
-                        if saved_id:
-                            note_data["onedrive_id"] = saved_id
-                            sync_stats["created"] += 1
-                            # Update maps to prevent future duplicates
-                            web_note_id_map[note_id] = new_filename
-                            if content_hash:
-                                if content_hash not in content_hash_map:
-                                    content_hash_map[content_hash] = []
-                                content_hash_map[content_hash].append(new_filename)
-                        else:
-                            sync_stats["errors"] += 1
+                        uploads[new_filename] = cloud_note_data
+                        planned.append((note_id, note_data, new_filename, "created"))
+                        # Update maps to prevent future duplicates
+                        web_note_id_map[note_id] = new_filename
+                        if content_hash:
+                            if content_hash not in content_hash_map:
+                                content_hash_map[content_hash] = []
+                            content_hash_map[content_hash].append(new_filename)
                     
                     synced_notes[note_id] = note_data
                     
@@ -682,6 +865,16 @@ class WebOneDriveManager:
                     synced_notes[note_id] = note_data
                     sync_stats["errors"] += 1
             
+            # Upload everything in as few Graph round trips as possible
+            saved_by_filename = dict(zip(uploads, self.batch_upload(list(uploads.items()))))
+            for note_id, note_data, filename, stat_key in planned:
+                saved_id = saved_by_filename.get(filename)
+                if saved_id:
+                    note_data["onedrive_id"] = saved_id
+                    sync_stats[stat_key] += 1
+                else:
+                    sync_stats["errors"] += 1
+            
             logger.info(f"OneDrive: Web sync completed - {sync_stats}")
             return {
                 "success": True,
@@ -769,11 +962,13 @@ class WebOneDriveManager:
                 "error": str(e)
             }
 
-    def load_notes_from_cloud(self, max_notes=None):
+    def load_notes_from_cloud(self, max_notes=None, known_etags=None):
         """
         Load notes from OneDrive with Railway deployment optimizations.
         Returns dict with notes formatted for web application.
         Handles both desktop format ('content') and web format ('text') fields.
+        known_etags maps OneDrive item IDs to the eTag already held locally;
+        those files are skipped unless their eTag has changed.
         """
         import time
         start_time = time.time()
@@ -792,7 +987,7 @@ class WebOneDriveManager:
             logger.info(f"OneDrive: Found {len(onedrive_notes)} notes, time elapsed: {time.time() - start_time:.1f}s")
             
             loaded_notes = {}
-            load_stats = {"loaded": 0, "errors": 0, "skipped": 0}
+            load_stats = {"loaded": 0, "errors": 0, "skipped": 0, "unchanged": 0}
             
             # Process ALL notes - no limits to ensure desktop app compatibility
             notes_to_process = onedrive_notes
@@ -825,6 +1020,11 @@ class WebOneDriveManager:
                             logger.warning(f"Performance circuit breaker: {avg_time_per_note:.1f}s/note is too slow - stopping at note {i+1}")
                             break
                     
+                    # Files whose eTag we already hold have not changed since we loaded them
+                    if known_etags and note_info.get("etag") and known_etags.get(note_info["id"]) == note_info["etag"]:
+                        load_stats["unchanged"] += 1
+                        continue
+                    
                     logger.info(f"OneDrive: Loading note {i+1}/{len(notes_to_process)}: {note_info['name']}")
                     note_start = time.time()
                     note_data = self.get_note(note_info["id"])
@@ -863,7 +1063,8 @@ class WebOneDriveManager:
                             "created": note_data.get("created", note_info["modified"]),
                             "modified": note_data.get("modified", note_data.get("last_modified", note_info["modified"])),
                             "owner": note_data.get("owner", note_data.get("source", "onedrive")),
-                            "onedrive_id": note_info["id"]
+                            "onedrive_id": note_info["id"],
+                            "onedrive_etag": note_info.get("etag")
                         }
                         
                         # Handle timestamp format conversion if needed
@@ -5,7 +5,6 @@ Try different approaches to resolve the ID token audience error.
 """
 
 import os
-import msal
 
 # Use the correct configuration
 CLIENT_ID = "cf7bb4c5-7271-4caf-adb3-f8f1f1bef9d5"
@@ -18,6 +17,13 @@ def test_alternative_approaches():
     print(f"AUTHORITY: {AUTHORITY}")
     print(f"SCOPES: {SCOPES}")
     
+    # Deferred so the configuration summary prints without paying for MSAL
+    try:
+        import msal
+    except ImportError:
+        print("❌ msal is not installed - run: pip install msal")
+        return False
+    
     # Approach 1: Try with validate_authority=False
     try:
         print("\n🔄 Approach 1: PublicClientApplication with validate_authority=False")
@@ -120,7 +120,23 @@ def test_railway_onedrive_functions():
         # For now, let's just test the push endpoint
         push_response = session.post(f"{RAILWAY_URL}/api/onedrive/sync/push")
         
-        if push_response.status_code == 200:
+        if push_response.status_code == 202:
+            # The push runs in the background; poll its job until it finishes
+            job_id = push_response.json().get('job_id')
+            print(f"⏳ Push queued as job {job_id}, polling for the result...")
+            push_data = {}
+            for _ in range(60):
+                status_response = session.get(f"{RAILWAY_URL}/api/onedrive/sync/status/{job_id}")
+                push_data = status_response.json()
+                if status_response.status_code != 200 or push_data.get('done'):
+                    break
+                time.sleep(1)
+            if push_data.get('done') and push_data.get('success'):
+                print(f"✅ Push successful!")
+                print(f"📊 Result: {push_data}")
+            else:
+                print(f"❌ Push failed: {push_data}")
+        elif push_response.status_code == 200:
             push_data = push_response.json()
             print(f"✅ Push successful!")
             print(f"📊 Result: {push_data}")
@@ -10,6 +10,9 @@ import time
 class DragTestApp:
     def __init__(self):
         self.root = tk.Tk()
+        # Keep the window unmapped while the tabs are built so the notebook
+        # lays out once instead of after every add
+        self.root.withdraw()
         self.root.title("Drag Debug Test")
         self.root.geometry("800x400")
         
@@ -42,6 +45,9 @@ class DragTestApp:
         # Add test button to check bindings
         test_button = ttk.Button(self.root, text="Test Bindings", command=self.test_bindings)
         test_button.pack(pady=5)
+        
+        self.root.update_idletasks()
+        self.root.deiconify()
     
     def setup_drag_bindings(self):
         """Setup drag bindings and report status."""
@@ -6,13 +6,27 @@ Run this to create multiple test tabs and try the new features.
 import os
 import sys
 import tempfile
-import shutil
+
+def _write_test_file(filepath, content):
+    """Write content plus a trailing newline with a single syscall."""
+    # O_EXCL refuses to follow or reuse anything already at filepath
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    fd = os.open(filepath, flags, 0o644)
+    try:
+        if hasattr(os, "writev"):
+            os.writev(fd, [content.encode('utf-8'), b"\n"])
+        else:
+            # Windows has no writev
+            os.write(fd, content.encode('utf-8') + b"\n")
+    finally:
+        os.close(fd)
 
 def create_test_files():
     """Create some test files with different names to test sorting."""
     try:
-        # Create temporary directory
-        test_dir = tempfile.mkdtemp(prefix="noted_test_")
+        # Create temporary directory; mkdtemp makes a fresh, private (0700)
+        # directory that no other local user can pre-create or plant files in
+        test_dir = tempfile.mkdtemp(prefix=f"noted_test_{os.getpid()}_")
         print(f"Creating test files in: {test_dir}")
         
         # Create test files with different names
@@ -25,23 +39,26 @@ def create_test_files():
         ]
         
         created_files = []
+        # test_dir never has a trailing separator and the names are bare
+        # basenames, so plain concatenation is equivalent to os.path.join
+        prefix = test_dir + os.sep
         for filename, content in test_files:
-            filepath = os.path.join(test_dir, filename)
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
+            filepath = prefix + filename
+            _write_test_file(filepath, content)
             created_files.append(filepath)
             print(f"Created: {filepath}")
         
-        print(f"\nTest files created! You can now:")
-        print(f"1. Run 'python noted.py' to start the app")
-        print(f"2. Open these files to create tabs:")
-        for filepath in created_files:
-            print(f"   - {filepath}")
-        print(f"3. Right-click on any tab and select 'Sort All Tabs by Name'")
-        print(f"4. Try dragging tabs to rearrange them manually")
-        print(f"5. Tabs should auto-sort: apple, banana, cherry, dog, zebra")
-        print(f"\nTest directory: {test_dir}")
-        print(f"Remember to clean up when done!")
+        sys.stdout.write("\n".join([
+            "\nTest files created! You can now:",
+            "1. Run 'python noted.py' to start the app",
+            "2. Open these files to create tabs:",
+            *(f"   - {filepath}" for filepath in created_files),
+            "3. Right-click on any tab and select 'Sort All Tabs by Name'",
+            "4. Try dragging tabs to rearrange them manually",
+            "5. Tabs should auto-sort: apple, banana, cherry, dog, zebra",
+            f"\nTest directory: {test_dir}",
+            "Remember to clean up when done!",
+        ]) + "\n")
         
         return test_dir, created_files
         
@@ -53,7 +70,12 @@ def cleanup_test_files(test_dir):
     """Clean up test files."""
     try:
         if test_dir and os.path.exists(test_dir):
-            shutil.rmtree(test_dir)
+            # create_test_files only writes flat files, so skip rmtree's
+            # recursive walk and per-entry lstat
+            with os.scandir(test_dir) as entries:
+                for entry in entries:
+                    os.unlink(entry.path)
+            os.rmdir(test_dir)
             print(f"Cleaned up test directory: {test_dir}")
     except Exception as e:
         print(f"Error cleaning up: {e}")
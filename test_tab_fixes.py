@@ -3,12 +3,36 @@
 Verification test for tab sorting and drag-drop fixes.
 This checks that the key functions exist and are properly integrated.
 """
+import functools
 import os
+from concurrent.futures import ThreadPoolExecutor
+import pathlib
+import re
 import sys
 
 # Add the current directory to the path to import noted
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+# Plain ASCII status labels on consoles that cannot encode emoji (e.g. cp1252)
+_PASS, _FAIL = (("✅ PASS", "❌ FAIL")
+                if (sys.stdout.encoding or "").lower().startswith("utf")
+                else ("[PASS]", "[FAIL]"))
+
+@functools.lru_cache(maxsize=1)
+def _noted_source():
+    """Read noted.py once and share the text between the checks below."""
+    return pathlib.Path('noted.py').read_text(encoding='utf-8')
+
+_CHECK_RE = re.compile(
+    r'(?P<auto_sort>self\.root\.after_idle\(self\.sort_tabs_by_name\))'
+    r'|(?P<drag_title>stored_title = tab_data\.get\("title", ""\))'
+)
+
+@functools.lru_cache(maxsize=1)
+def _noted_hits():
+    """Scan noted.py once for every integration marker checked below."""
+    return frozenset(m.lastgroup for m in _CHECK_RE.finditer(_noted_source()))
+
 def test_functions_exist():
     """Test that all necessary functions exist in the noted module."""
     try:
@@ -28,14 +52,14 @@ def test_functions_exist():
         ]
         
         print("🔍 Checking for required methods...")
-        missing_methods = []
+        present = set(dir(EditableBoxApp))
+        missing_methods = [m for m in methods_to_check if m not in present]
         
         for method_name in methods_to_check:
-            if hasattr(EditableBoxApp, method_name):
+            if method_name in present:
                 print(f"  ✅ {method_name} - Found")
             else:
                 print(f"  ❌ {method_name} - MISSING")
-                missing_methods.append(method_name)
         
         if missing_methods:
             print(f"\n❌ Missing methods: {missing_methods}")
@@ -51,11 +75,8 @@ def test_functions_exist():
 def test_auto_sort_integration():
     """Test that auto-sort is integrated into add_text_box."""
     try:
-        with open('noted.py', 'r', encoding='utf-8') as f:
-            content = f.read()
-        
         # Check for auto-sort integration in add_text_box
-        if 'self.root.after_idle(self.sort_tabs_by_name)' in content:
+        if 'auto_sort' in _noted_hits():
             print("✅ Auto-sort integration found in add_text_box")
             return True
         else:
@@ -69,11 +90,8 @@ def test_auto_sort_integration():
 def test_drag_drop_title_fix():
     """Test that drag-drop title preservation is fixed."""
     try:
-        with open('noted.py', 'r', encoding='utf-8') as f:
-            content = f.read()
-        
         # Check for improved title fallback in _move_tab
-        if 'stored_title = tab_data.get("title", "")' in content:
+        if 'drag_title' in _noted_hits():
             print("✅ Drag-drop title preservation fix found")
             return True
         else:
@@ -96,11 +114,16 @@ def main():
     ]
     
     results = []
-    for test_name, test_func in tests:
-        print(f"\n📋 Running: {test_name}")
-        print("-" * 30)
-        result = test_func()
-        results.append((test_name, result))
+    # Read and scan noted.py in the background while the first check is busy
+    # importing it; the checks themselves stay sequential so output is ordered
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(_noted_hits)
+        for test_name, test_func in tests:
+            print(f"\n📋 Running: {test_name}")
+            print("-" * 30)
+            passed = test_func()
+            results.append((test_name, passed))
+            print(f"  {_PASS if passed else _FAIL} - {test_name}")
     
     print("\n" + "=" * 50)
     print("📊 SUMMARY")
@@ -108,8 +131,7 @@ def main():
     
     all_passed = True
     for test_name, passed in results:
-        status = "✅ PASS" if passed else "❌ FAIL"
-        print(f"  {status} - {test_name}")
+        print(f"  {_PASS if passed else _FAIL} - {test_name}")
         if not passed:
             all_passed = False
     
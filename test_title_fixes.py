@@ -3,9 +3,32 @@
 Test script to verify that tab title fixes are working properly.
 This tests that titles are preserved during sorting operations.
 """
+import functools
 import os
+import pathlib
+import re
 import sys
 
+# Plain ASCII status labels on consoles that cannot encode emoji (e.g. cp1252)
+_PASS, _FAIL = (("✅ PASS", "❌ FAIL")
+                if (sys.stdout.encoding or "").lower().startswith("utf")
+                else ("[PASS]", "[FAIL]"))
+
+# Longer needles come first so the alternation prefers them; the bare
+# attribute name is implied by either of the assignment matches.
+_CHECK_RE = re.compile(
+    r'(?P<startup_flag>self\._app_startup_complete = False)'
+    r'|(?P<startup_done>self\._app_startup_complete = True)'
+    r'|(?P<startup_ref>_app_startup_complete)'
+    r'|(?P<sort_title>stored_title = data\.get\("title", ""\))'
+    r'|(?P<drag_title>stored_title = tab_data\.get\("title", ""\))'
+)
+
+@functools.lru_cache(maxsize=1)
+def _noted_source():
+    """Read noted.py once per process."""
+    return pathlib.Path('noted.py').read_text(encoding='utf-8')
+
 def test_tab_title_fixes():
     """Test that the tab title fixes are in place."""
     
@@ -13,33 +36,36 @@ def test_tab_title_fixes():
     print("=" * 50)
     
     try:
-        with open('noted.py', 'r', encoding='utf-8') as f:
-            content = f.read()
+        content = _noted_source()
+        
+        hits = {m.lastgroup for m in _CHECK_RE.finditer(content)}
         
         checks = [
-            ('Auto-sort startup prevention', '_app_startup_complete' in content),
-            ('Sorting function title generation', 'stored_title = data.get("title", "")' in content),
-            ('Drag-drop title fallback', 'stored_title = tab_data.get("title", "")' in content),
-            ('Startup flag initialization', 'self._app_startup_complete = False' in content),
-            ('Startup completion flag', 'self._app_startup_complete = True' in content),
+            ('Auto-sort startup prevention', bool(hits & {'startup_ref', 'startup_flag', 'startup_done'})),
+            ('Sorting function title generation', 'sort_title' in hits),
+            ('Drag-drop title fallback', 'drag_title' in hits),
+            ('Startup flag initialization', 'startup_flag' in hits),
+            ('Startup completion flag', 'startup_done' in hits),
         ]
         
         all_passed = True
         for check_name, passed in checks:
-            status = "✅ PASS" if passed else "❌ FAIL"
+            status = _PASS if passed else _FAIL
             print(f"  {status} - {check_name}")
             if not passed:
                 all_passed = False
         
         print("\n" + "=" * 50)
         if all_passed:
-            print("🎉 All tab title fixes are in place!")
-            print("\n📝 The fixes should now:")
-            print("  • Show proper tab titles on app startup")  
-            print("  • Preserve titles during sorting operations")
-            print("  • Preserve titles during drag-and-drop")
-            print("  • Auto-sort only new tabs (not during startup)")
-            print("\n🚀 Try running the app to verify the fixes work!")
+            sys.stdout.write("\n".join([
+                "🎉 All tab title fixes are in place!",
+                "\n📝 The fixes should now:",
+                "  • Show proper tab titles on app startup",
+                "  • Preserve titles during sorting operations",
+                "  • Preserve titles during drag-and-drop",
+                "  • Auto-sort only new tabs (not during startup)",
+                "\n🚀 Try running the app to verify the fixes work!",
+            ]) + "\n")
         else:
             print("⚠️  Some fixes are missing. Please check the failed items.")
             
@@ -5,24 +5,42 @@ Works on desktop and mobile browsers, easier to deploy than native Android
 Now with comprehensive security protection
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory, session, redirect, url_for, flash, make_response
-from flask_session import Session
+from flask import Flask, render_template, request, jsonify, send_from_directory, session, redirect, url_for, flash, make_response, g, Response, has_request_context
+from flask.json.provider import DefaultJSONProvider
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_wtf.csrf import CSRFProtect, validate_csrf, CSRFError, generate_csrf
 from werkzeug.security import check_password_hash, generate_password_hash
+import atexit
 import json
 import os
 import sys
+import tempfile
+import threading
 import uuid
 import time
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import logging
-from functools import wraps
+import operator
+from functools import lru_cache, wraps
 import secrets
+import string
 import hashlib
-from dateutil import parser
+import hmac
+
+# Faster JSON encoding/decoding for the note and device stores when available
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Brotli/gzip compression for large JSON responses when available
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
 
 # OneDrive integration
 try:
@@ -34,12 +52,85 @@ except ImportError as e:
 
 app = Flask(__name__)
 
+if orjson:
+    class OrjsonProvider(DefaultJSONProvider):
+        """Flask JSON provider that encodes and decodes with orjson"""
+        
+        def _options(self, pretty=False):
+            # Dates go through Flask's default() so they keep the HTTP date format
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if pretty:
+                option |= orjson.OPT_INDENT_2
+            return option
+        
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, default=self.default, option=self._options()).decode('utf-8')
+        
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+        
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            pretty = (self.compact is None and self._app.debug) or self.compact is False
+            body = orjson.dumps(obj, default=self.default, option=self._options(pretty) | orjson.OPT_APPEND_NEWLINE)
+            return self._app.response_class(body, mimetype=self.mimetype)
+    
+    app.json = OrjsonProvider(app)
+
+# Responses are read by the page's scripts, not people: skip the key sort and
+# the debug-mode indentation
+app.json.sort_keys = False
+app.json.compact = True
+
+# Note lists and OneDrive sync results carry every note and compress well;
+# small JSON answers aren't worth the CPU
+if Compress:
+    app.config['COMPRESS_MIMETYPES'] = ['application/json']
+    app.config['COMPRESS_MIN_SIZE'] = 1024
+    app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+    # Streamed bodies (note lists, large sync results) are compressed on the
+    # fly; flask-compress leaves gzip out of its streaming default
+    app.config['COMPRESS_ALGORITHM_STREAMING'] = ['br', 'gzip']
+    Compress(app)
+
+def _load_secret_key():
+    """Return SECRET_KEY, or a key persisted in web_notes/.secret_key when it is unset.
+
+    Sessions are cookies signed with this key, so a random per-process key
+    would log every user out on each restart or gunicorn worker recycle.
+    """
+    key = os.environ.get('SECRET_KEY')
+    if key:
+        return key
+    
+    key_file = os.path.join(os.path.dirname(__file__), 'web_notes', '.secret_key')
+    os.makedirs(os.path.dirname(key_file), exist_ok=True)
+    # Write a candidate privately, then link it into place: link() fails if
+    # another process got there first, and readers never see a partial key
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(key_file))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(tmp_path, key_file)
+        except FileExistsError:
+            pass
+    finally:
+        os.unlink(tmp_path)
+    with open(key_file, encoding='utf-8') as f:
+        key = f.read().strip()
+    
+    production = os.environ.get('RAILWAY_ENVIRONMENT') is not None or os.environ.get('FLASK_ENV') == 'production'
+    print(f"{'WARNING' if production else 'INFO'}: SECRET_KEY is not set; signing sessions with the key "
+          f"stored in {key_file}. Set SECRET_KEY so sessions survive redeploys.", file=sys.stderr)
+    return key
+
 # Security Configuration
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', secrets.token_hex(32))
-app.config['SESSION_TYPE'] = 'filesystem'
-app.config['SESSION_PERMANENT'] = True  # Make sessions persistent
+app.config['SECRET_KEY'] = _load_secret_key()
+# Sessions are Flask's signed cookies; they only carry small flags and ids
 app.config['PERMANENT_SESSION_LIFETIME'] = 86400 * 30  # 30 days to match device trust duration
-app.config['SESSION_FILE_THRESHOLD'] = 100
 app.config['WTF_CSRF_TIME_LIMIT'] = 3600
 
 # Authentication Configuration - Optional for Railway deployment
@@ -52,10 +143,31 @@ if not AUTH_ENABLED:
     print("INFO: Authentication disabled - NOTED_USERNAME and NOTED_PASSWORD_HASH not set")
     print("INFO: Running in open access mode for Railway deployment")
 
+# Hash checked when the username is wrong so failed logins always cost one hash.
+# Built on a background thread at boot: worker boot doesn't wait for the KDF,
+# and no login request pays for generating it on top of checking it.
+_dummy_hash = None
+_dummy_hash_ready = threading.Event()
+
+def _build_dummy_password_hash():
+    """Generate the dummy hash with the same method and parameters as the real one"""
+    global _dummy_hash
+    _dummy_hash = generate_password_hash(secrets.token_hex(16), method=PASSWORD_HASH.split('$', 1)[0])
+    _dummy_hash_ready.set()
+
+if AUTH_ENABLED:
+    threading.Thread(target=_build_dummy_password_hash, name='dummy-password-hash', daemon=True).start()
+
+def _dummy_password_hash():
+    """Return the dummy hash, waiting for the boot thread only if a login races it"""
+    _dummy_hash_ready.wait()
+    return _dummy_hash
+
 # Configuration
 NOTES_DIR = os.path.join(os.path.dirname(__file__), 'web_notes')
 TRUSTED_DEVICES_FILE = os.path.join(NOTES_DIR, 'trusted_devices.json')
-os.makedirs(NOTES_DIR, exist_ok=True)
+OFFLINE_DIR = os.path.join(NOTES_DIR, 'offline')
+os.makedirs(OFFLINE_DIR, exist_ok=True)  # Also creates NOTES_DIR
 
 # Device trust configuration
 DEVICE_TRUST_DURATION = int(os.environ.get('DEVICE_TRUST_DAYS', 30))  # Days to trust device
@@ -65,6 +177,13 @@ DEVICE_COOKIE_NAME = 'noted_device_id'
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# DEBUG_ONEDRIVE=1 turns on the per-request OneDrive auth diagnostics, which
+# otherwise cost a formatted log line on every device-flow poll
+DEBUG_ONEDRIVE = os.environ.get('DEBUG_ONEDRIVE') == '1'
+if DEBUG_ONEDRIVE:
+    logger.setLevel(logging.DEBUG)
+    logging.getLogger('onedrive_web_manager').setLevel(logging.DEBUG)
+
 # Helper function for conditional CSRF validation
 def validate_csrf_if_enabled(csrf_token):
     """Only validate CSRF if authentication is enabled"""
@@ -72,7 +191,6 @@ def validate_csrf_if_enabled(csrf_token):
         validate_csrf(csrf_token)
 
 # Initialize security extensions after logger setup
-Session(app)
 if AUTH_ENABLED:
     csrf = CSRFProtect(app)
     logger.info("🛡️  CSRF protection enabled")
@@ -80,16 +198,33 @@ else:
     csrf = None
     logger.info("⚠️  CSRF protection disabled (no authentication)")
     
+# Shared storage (e.g. redis://host:6379) keeps counters correct across
+# gunicorn workers; in-memory storage is per-process
+LIMITER_STORAGE_URI = os.environ.get('LIMITER_STORAGE_URI') or os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
 limiter = Limiter(
     key_func=get_remote_address,
     app=app,
-    default_limits=["100 per hour", "20 per minute"]
+    default_limits=["100 per hour", "20 per minute"],
+    storage_uri=LIMITER_STORAGE_URI
+)
+# The auth polling routes are hit every few seconds while a device flow is
+# pending; keep their counters in-process so each poll skips the round trip
+# to shared storage. Those routes are exempt from the main limiter.
+poll_limiter = Limiter(
+    key_func=get_remote_address,
+    app=app,
+    storage_uri='memory://',
+    strategy='moving-window'
 )
 
 # Initialize OneDrive Manager
 onedrive_manager = None
 onedrive_error_message = None
 
+# Read once; the auth start routes consult it on every failed start
+_CLIENT_ID = os.environ.get('NOTED_CLIENT_ID', '')
+_CLIENT_ID_PRESENT = bool(_CLIENT_ID)
+
 if ONEDRIVE_AVAILABLE and 'WebOneDriveManager' in globals():
     try:
         onedrive_manager = WebOneDriveManager()
@@ -104,91 +239,244 @@ else:
     logger.info("⚠️  OneDrive integration not available (import failed)")
     onedrive_error_message = "OneDrive dependencies not installed"
 
-# Create session directory in a Railway-compatible location (after logger is defined)
-# Railway containers are ephemeral, but we can try to use /app for better persistence
 is_railway = os.environ.get('RAILWAY_ENVIRONMENT') is not None
 
+# Session lifetime on Railway for OneDrive persistence
 if is_railway:
-    session_dir = '/app/flask_session'
-    logger.info("🚂 Railway deployment detected - using /app/flask_session for better persistence")
-else:
-    session_dir = os.path.join(os.path.dirname(__file__), 'flask_session')
-
-try:
-    os.makedirs(session_dir, exist_ok=True)
-    app.config['SESSION_FILE_DIR'] = session_dir
-    
-    # Extend session lifetime on Railway for OneDrive persistence
-    if is_railway:
-        app.config['PERMANENT_SESSION_LIFETIME'] = 86400 * 7  # 7 days on Railway
-        logger.info("🔒 Extended session lifetime to 7 days for Railway deployment")
-    
-    logger.info(f"Session directory created: {session_dir}")
-except Exception as e:
-    logger.warning(f"Could not create session directory, using default: {e}")
-    # Railway will use /tmp if we can't create our own directory
+    app.config['PERMANENT_SESSION_LIFETIME'] = 86400 * 7  # 7 days on Railway
+    logger.info("🔒 Extended session lifetime to 7 days for Railway deployment")
+
+# Last formatted wall-clock second: (epoch second, isoformat string)
+_iso_second_cache = (0, '')
+
+def now_iso():
+    """Return the current local time as an ISO 8601 string at one-second resolution.
+
+    Within a request every call returns the same timestamp, so a note's
+    fields never straddle a second boundary.
+    """
+    if has_request_context():
+        iso = g.get('now_iso')
+        if iso is None:
+            iso = g.now_iso = _current_iso_second()
+        return iso
+    return _current_iso_second()
+
+def _current_iso_second():
+    """Format the current second, sharing one string across callers in that second.
+
+    Concurrent callers may both format the same second, which is harmless.
+    """
+    global _iso_second_cache
+    second = int(time.time())
+    cached_second, cached_iso = _iso_second_cache
+    if cached_second == second:
+        return cached_iso
+    iso = datetime.fromtimestamp(second).isoformat()
+    _iso_second_cache = (second, iso)
+    return iso
 
 # Device Trust System
-def generate_device_fingerprint():
-    """Generate a device fingerprint based on request headers and IP"""
-    # Collect device information
+def _fingerprint_source():
+    """Collect the request headers and IP that identify a device"""
     user_agent = request.headers.get('User-Agent', '')
     accept_language = request.headers.get('Accept-Language', '')
     accept_encoding = request.headers.get('Accept-Encoding', '')
     remote_addr = get_remote_address()
+    return f"{user_agent}|{accept_language}|{accept_encoding}|{remote_addr}".encode()
+
+def generate_device_fingerprint():
+    """Generate a device fingerprint based on request headers and IP"""
+    # Computed once per request; trust checks, trust creation and last-used
+    # updates all share it
+    if 'device_fp' in g:
+        return g.device_fp
     
-    # Create fingerprint
-    fingerprint_data = f"{user_agent}|{accept_language}|{accept_encoding}|{remote_addr}"
-    fingerprint_hash = hashlib.sha256(fingerprint_data.encode()).hexdigest()
+    # The fingerprint is only an equality key next to the device cookie, so
+    # BLAKE2b is used instead of SHA-256; 32-byte digests keep the hex length
+    fingerprint_hash = hashlib.blake2b(_fingerprint_source(), digest_size=32).hexdigest()
     
+    g.device_fp = fingerprint_hash
     return fingerprint_hash
 
+def _upgrade_legacy_trust(device_id, fingerprint, by_device_id):
+    """Re-key a trust entry stored with the old SHA-256 fingerprint.
+
+    Returns the upgraded entry, or None if this device has no legacy entry.
+    """
+    legacy_fingerprint = hashlib.sha256(_fingerprint_source()).hexdigest()
+    trusted_devices = load_trusted_devices()
+    for key in by_device_id.get(device_id, ()):
+        device_data = trusted_devices.get(key)
+        if device_data and device_data.get('fingerprint') == legacy_fingerprint:
+            del trusted_devices[key]
+            device_data['fingerprint'] = fingerprint
+            trusted_devices[f"{device_id}_{fingerprint[:8]}"] = device_data
+            save_trusted_devices(trusted_devices)
+            logger.info(f"Upgraded trusted device fingerprint: {key}")
+            return device_data
+    return None
+
 def get_device_id():
     """Get or create a unique device ID"""
+    # Memoized so a newly generated ID stays the same for the whole request
+    if 'device_id' in g:
+        return g.device_id
+    
     device_id = request.cookies.get(DEVICE_COOKIE_NAME)
     if not device_id:
         device_id = str(uuid.uuid4())
+    g.device_id = device_id
     return device_id
 
-def load_trusted_devices():
-    """Load trusted devices from JSON file"""
+# Parsed JSON stores, reloaded only when the file's mtime changes
+_devices_cache = {'mtime': None, 'data': {}}
+_json_cache_lock = threading.Lock()
+
+def _json_loads(raw):
+    """Parse JSON bytes with orjson when available"""
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+def _json_dumps_compact(obj):
+    """Serialize obj to compact UTF-8 JSON bytes with orjson when available"""
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def _read_json_cached(path, cache):
+    """Return the parsed contents of path, reparsing only if its mtime changed.
+
+    The returned dict is shared with the cache; callers must not mutate it.
+    Raises on unreadable or malformed files, like json.load.
+    """
     try:
-        if os.path.exists(TRUSTED_DEVICES_FILE):
-            with open(TRUSTED_DEVICES_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    
+    with _json_cache_lock:
+        if cache['mtime'] != mtime:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            cache['data'] = _json_loads(raw)
+            cache['mtime'] = mtime
+        return cache['data']
+
+def _json_dumps_pretty(obj):
+    """Serialize obj to indented UTF-8 JSON bytes with orjson when available"""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+def _atomic_write_json(path, data):
+    """Serialize data and atomically replace path with it.
+
+    Returns the new file's st_mtime_ns so callers can prime their caches
+    without another stat.
+    """
+    payload = _json_dumps_pretty(data)
+    # Write to a temp file in the same directory so a killed container never
+    # leaves a half-written store behind
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            # The rename below keeps the inode, so this is the mtime path will report
+            mtime = os.fstat(f.fileno()).st_mtime_ns
+        os.replace(tmp_path, path)
+        return mtime
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _write_json_cached(path, data, cache):
+    """Write data to path and refresh the cache from what was written"""
+    with _json_cache_lock:
+        mtime = _atomic_write_json(path, data)
+        # Entries are flat dicts, so a two-level copy keeps later caller edits out of the cache
+        cache['data'] = {key: dict(value) for key, value in data.items()}
+        cache['mtime'] = mtime
+
+# device_id -> trust keys for the cached devices dict, rebuilt when that dict is replaced
+_devices_index = {'data': None, 'by_device_id': {}}
+
+def _cached_trusted_devices():
+    """Return the shared (devices, by_device_id) pair; callers must not mutate them"""
+    try:
+        devices = _read_json_cached(TRUSTED_DEVICES_FILE, _devices_cache)
     except Exception as e:
         logger.error(f"Error loading trusted devices: {e}")
-    return {}
+        return {}, {}
+    
+    with _json_cache_lock:
+        if _devices_index['data'] is not devices:
+            by_device_id = {}
+            for key, device_data in devices.items():
+                by_device_id.setdefault(device_data.get('device_id'), []).append(key)
+            _devices_index['data'] = devices
+            _devices_index['by_device_id'] = by_device_id
+        return devices, _devices_index['by_device_id']
+
+def load_trusted_devices():
+    """Load trusted devices from JSON file"""
+    devices, _ = _cached_trusted_devices()
+    return {key: dict(device_data) for key, device_data in devices.items()}
 
 def save_trusted_devices(devices):
     """Save trusted devices to JSON file"""
     try:
-        with open(TRUSTED_DEVICES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(devices, f, indent=2, ensure_ascii=False)
+        _write_json_cached(TRUSTED_DEVICES_FILE, devices, _devices_cache)
         return True
     except Exception as e:
         logger.error(f"Error saving trusted devices: {e}")
         return False
 
+def _device_expiry_ts(device_data):
+    """Return a trusted device's expiry as an epoch timestamp"""
+    expires_ts = device_data.get('expires_ts')
+    if expires_ts is None:
+        # Entries written before expires_ts was stored
+        expires_ts = datetime.fromisoformat(device_data['expires_at']).timestamp()
+    return expires_ts
+
+def _device_last_used_ts(device_data):
+    """Return a trusted device's last use as an epoch timestamp, 0 if unknown"""
+    last_used_ts = device_data.get('last_used_ts')
+    if last_used_ts is None:
+        try:
+            last_used_ts = datetime.fromisoformat(device_data['last_used']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            last_used_ts = 0
+    return last_used_ts
+
 def is_device_trusted():
     """Check if current device is trusted"""
     device_id = get_device_id()
     fingerprint = generate_device_fingerprint()
     
-    trusted_devices = load_trusted_devices()
+    trusted_devices, by_device_id = _cached_trusted_devices()
     
-    # First check if device is in trusted devices file
-    for device_data in trusted_devices.values():
-        if (device_data.get('device_id') == device_id and 
-            device_data.get('fingerprint') == fingerprint):
-            
-            # Check if trust hasn't expired
-            trust_expiry = parser.parse(device_data.get('expires_at'))
-            if datetime.now() < trust_expiry:
-                return True
-            else:
-                # Remove expired trust
-                remove_device_trust(device_id)
+    # First check if device is in trusted devices file; add_device_trust stores
+    # entries under this key, so the scan is only needed for older entries
+    device_data = trusted_devices.get(f"{device_id}_{fingerprint[:8]}")
+    if device_data is None or device_data.get('fingerprint') != fingerprint:
+        device_data = next((trusted_devices[key] for key in by_device_id.get(device_id, ())
+                            if trusted_devices[key].get('fingerprint') == fingerprint), None)
+    if device_data is None and device_id in by_device_id:
+        device_data = _upgrade_legacy_trust(device_id, fingerprint, by_device_id)
+    
+    if device_data is not None:
+        # Check if trust hasn't expired
+        if time.time() < _device_expiry_ts(device_data):
+            return True
+        else:
+            # Remove expired trust
+            remove_device_trust(device_id)
     
     # Railway fallback: If trusted_devices.json is empty/missing but we have a device cookie,
     # check if the cookie seems recent (was set in the browser)
@@ -219,15 +507,19 @@ def add_device_trust(device_name=None):
     if not device_name:
         device_name = f"{device_info['browser']} on {device_info['os']}"
     
+    now = datetime.now()
+    expires_at = now + timedelta(days=DEVICE_TRUST_DURATION)
     trust_data = {
         'device_id': device_id,
         'fingerprint': fingerprint,
         'name': device_name,
         'user_agent': user_agent,
         'ip_address': get_remote_address(),
-        'created_at': datetime.now().isoformat(),
-        'expires_at': (datetime.now() + timedelta(days=DEVICE_TRUST_DURATION)).isoformat(),
-        'last_used': datetime.now().isoformat()
+        'created_at': now.isoformat(),
+        'expires_at': expires_at.isoformat(),
+        'expires_ts': int(expires_at.timestamp()),
+        'last_used': now.isoformat(),
+        'last_used_ts': int(now.timestamp())
     }
     
     trusted_devices = load_trusted_devices()
@@ -235,7 +527,7 @@ def add_device_trust(device_name=None):
     trusted_devices[trust_key] = trust_data
     
     # Clean up expired devices while we're here
-    cleanup_expired_devices(trusted_devices)
+    trusted_devices = cleanup_expired_devices(trusted_devices)
     
     save_trusted_devices(trusted_devices)
     logger.info(f"Added trusted device: {device_name}")
@@ -243,85 +535,135 @@ def add_device_trust(device_name=None):
 
 def remove_device_trust(device_id):
     """Remove device trust"""
-    trusted_devices = load_trusted_devices()
-    
-    # Find and remove device
-    keys_to_remove = []
-    for key, device_data in trusted_devices.items():
-        if device_data.get('device_id') == device_id:
-            keys_to_remove.append(key)
+    _, by_device_id = _cached_trusted_devices()
+    keys_to_remove = by_device_id.get(device_id)
+    if not keys_to_remove:
+        return
     
+    trusted_devices = load_trusted_devices()
     for key in keys_to_remove:
-        del trusted_devices[key]
-        logger.info(f"Removed trusted device: {key}")
+        if trusted_devices.pop(key, None) is not None:
+            logger.info(f"Removed trusted device: {key}")
     
     save_trusted_devices(trusted_devices)
 
+# Device lists carry a precomputed '_sk' (negated last-used timestamp) while sorting
+_BY_SORT_KEY = operator.itemgetter('_sk')
+
+# Expired entries are swept from the store at most this often; in between,
+# readers skip them with _device_is_live
+DEVICE_CLEANUP_INTERVAL = 3600  # seconds
+_last_device_cleanup = 0.0
+
+def _device_is_live(device_data, current_time):
+    """Return True if a trusted device entry is well-formed and unexpired"""
+    try:
+        return current_time < _device_expiry_ts(device_data)
+    except Exception:
+        return False
+
 def cleanup_expired_devices(devices_dict=None):
-    """Remove expired trusted devices"""
+    """Remove expired trusted devices, at most once per DEVICE_CLEANUP_INTERVAL.
+
+    Returns the remaining devices; devices_dict (or the stored devices, when
+    called without one) is returned unchanged when the sweep is skipped or
+    finds nothing.
+    """
+    global _last_device_cleanup
     if devices_dict is None:
         devices_dict = load_trusted_devices()
     
-    current_time = datetime.now()
-    expired_keys = []
-    
-    for key, device_data in devices_dict.items():
-        try:
-            expires_at = parser.parse(device_data.get('expires_at'))
-            if current_time >= expires_at:
-                expired_keys.append(key)
-        except Exception:
-            # Remove malformed entries
-            expired_keys.append(key)
-    
-    for key in expired_keys:
-        del devices_dict[key]
-    
-    if expired_keys:
-        save_trusted_devices(devices_dict)
-        logger.info(f"Cleaned up {len(expired_keys)} expired trusted devices")
+    current_time = time.time()
+    if current_time - _last_device_cleanup < DEVICE_CLEANUP_INTERVAL:
+        return devices_dict
+    _last_device_cleanup = current_time
+    
+    # Malformed entries are removed too
+    kept = {key: device_data for key, device_data in devices_dict.items()
+            if _device_is_live(device_data, current_time)}
+    if len(kept) == len(devices_dict):
+        return devices_dict
+    
+    save_trusted_devices(kept)
+    logger.info(f"Cleaned up {len(devices_dict) - len(kept)} expired trusted devices")
+    return kept
+
+# Token -> name in priority order: more specific platforms come before the
+# generic ones they embed (Android UAs contain "Linux", iOS ones "Mac OS X")
+_UA_OS_NAMES = {
+    'windows': 'Windows',
+    'android': 'Android',
+    'iphone': 'iOS',
+    'ipad': 'iOS',
+    'mac': 'macOS',
+    'darwin': 'macOS',
+    'linux': 'Linux',
+}
+# Edge UAs also contain "chrome", and Chrome UAs contain "safari"
+_UA_BROWSER_NAMES = {
+    'edg': 'Edge',
+    'chrome': 'Chrome',
+    'firefox': 'Firefox',
+    'safari': 'Safari',
+}
+_UA_OS_RE = re.compile('|'.join(_UA_OS_NAMES))
+_UA_BROWSER_RE = re.compile('|'.join(_UA_BROWSER_NAMES))
+
+def _match_ua_token(pattern, names, ua):
+    """Return the name of the highest-priority token found in ua"""
+    found = set(pattern.findall(ua))
+    return next((name for token, name in names.items() if token in found), 'Unknown')
 
 def parse_user_agent(user_agent):
     """Simple user agent parsing for device identification"""
     ua = user_agent.lower()
-    
-    # Detect OS
-    if 'windows' in ua:
-        os_name = 'Windows'
-    elif 'mac' in ua or 'darwin' in ua:
-        os_name = 'macOS'
-    elif 'linux' in ua:
-        os_name = 'Linux'
-    elif 'android' in ua:
-        os_name = 'Android'
-    elif 'iphone' in ua or 'ipad' in ua:
-        os_name = 'iOS'
-    else:
-        os_name = 'Unknown'
-    
-    # Detect browser
-    if 'chrome' in ua and 'edg' not in ua:
-        browser = 'Chrome'
-    elif 'firefox' in ua:
-        browser = 'Firefox'
-    elif 'safari' in ua and 'chrome' not in ua:
-        browser = 'Safari'
-    elif 'edg' in ua:
-        browser = 'Edge'
-    else:
-        browser = 'Unknown'
-    
+    os_name = _match_ua_token(_UA_OS_RE, _UA_OS_NAMES, ua)
+    browser = _match_ua_token(_UA_BROWSER_RE, _UA_BROWSER_NAMES, ua)
     return {'os': os_name, 'browser': browser}
 
+# last_used updates not yet written to the store: trust key -> epoch seconds.
+# Trusted-device requests would otherwise rewrite the whole file each time.
+LAST_USED_FLUSH_INTERVAL = 60  # seconds
+_pending_last_used = {}
+_last_used_lock = threading.Lock()
+_last_used_flushed_at = time.time()
+
 def update_device_last_used(device_id):
-    """Update last used timestamp for trusted device"""
-    trusted_devices = load_trusted_devices()
+    """Record that a trusted device was just used; written out by flush_device_last_used"""
+    trusted_devices, by_device_id = _cached_trusted_devices()
+    
+    trust_key = f"{device_id}_{generate_device_fingerprint()[:8]}"
+    if trust_key not in trusted_devices:
+        keys = by_device_id.get(device_id)
+        if not keys:
+            return
+        trust_key = keys[0]
+    
+    now = time.time()
+    with _last_used_lock:
+        _pending_last_used[trust_key] = now
+        flush_due = now - _last_used_flushed_at >= LAST_USED_FLUSH_INTERVAL
+    if flush_due:
+        flush_device_last_used()
+
+@atexit.register
+def flush_device_last_used():
+    """Write buffered last_used timestamps to the trusted devices file"""
+    global _last_used_flushed_at
+    with _last_used_lock:
+        pending = dict(_pending_last_used)
+        _pending_last_used.clear()
+        _last_used_flushed_at = time.time()
+    if not pending:
+        return
     
-    for device_data in trusted_devices.values():
-        if device_data.get('device_id') == device_id:
-            device_data['last_used'] = datetime.now().isoformat()
-            save_trusted_devices(trusted_devices)
-            break
+    trusted_devices = load_trusted_devices()
+    for trust_key, last_used_ts in pending.items():
+        device_data = trusted_devices.get(trust_key)
+        if device_data is not None:
+            device_data['last_used'] = datetime.fromtimestamp(last_used_ts).isoformat()
+            device_data['last_used_ts'] = int(last_used_ts)
+    save_trusted_devices(trusted_devices)
 
 # Security headers middleware
 @app.after_request
@@ -401,7 +743,11 @@ def login():
             password = data.get('password', '')
             remember_device = data.get('remember_device', False)
             
-            if username == USERNAME and PASSWORD_HASH and check_password_hash(PASSWORD_HASH, password):
+            # Constant-time username compare, and the password hash is checked
+            # either way so a wrong username takes as long as a wrong password
+            username_ok = hmac.compare_digest(username.encode(), USERNAME.encode())
+            password_ok = check_password_hash(PASSWORD_HASH if username_ok else _dummy_password_hash(), password)
+            if username_ok and password_ok:
                 # Set session
                 session['authenticated'] = True
                 session['username'] = username
@@ -467,21 +813,28 @@ def logout():
 @login_required
 def manage_devices():
     """Device management page"""
+    flush_device_last_used()
     trusted_devices = load_trusted_devices()
     current_device_id = session.get('device_id') or get_device_id()
     
     # Clean up expired devices
-    cleanup_expired_devices(trusted_devices)
+    trusted_devices = cleanup_expired_devices(trusted_devices)
     
     # Prepare device list for display
+    current_time = time.time()
     devices_list = []
     for key, device_data in trusted_devices.items():
+        if not _device_is_live(device_data, current_time):
+            continue
         device_data['key'] = key
         device_data['is_current'] = device_data.get('device_id') == current_device_id
+        device_data['_sk'] = -_device_last_used_ts(device_data)
         devices_list.append(device_data)
     
     # Sort by last used (most recent first)
-    devices_list.sort(key=lambda x: x.get('last_used', ''), reverse=True)
+    devices_list.sort(key=_BY_SORT_KEY)
+    for device_data in devices_list:
+        del device_data['_sk']
     
     return render_template('devices.html', devices=devices_list, current_device_id=current_device_id)
 
@@ -490,13 +843,17 @@ def manage_devices():
 def get_trusted_devices():
     """Get list of trusted devices"""
     try:
+        flush_device_last_used()
         trusted_devices = load_trusted_devices()
         current_device_id = session.get('device_id') or get_device_id()
         
-        cleanup_expired_devices(trusted_devices)
+        trusted_devices = cleanup_expired_devices(trusted_devices)
         
+        current_time = time.time()
         devices_list = []
         for key, device_data in trusted_devices.items():
+            if not _device_is_live(device_data, current_time):
+                continue
             device_info = {
                 'key': key,
                 'name': device_data.get('name', 'Unknown Device'),
@@ -504,11 +861,15 @@ def get_trusted_devices():
                 'last_used': device_data.get('last_used'),
                 'expires_at': device_data.get('expires_at'),
                 'ip_address': device_data.get('ip_address'),
-                'is_current': device_data.get('device_id') == current_device_id
+                'is_current': device_data.get('device_id') == current_device_id,
+                '_sk': -_device_last_used_ts(device_data)
             }
             devices_list.append(device_info)
         
-        devices_list.sort(key=lambda x: x.get('last_used', ''), reverse=True)
+        # Sort by last used (most recent first)
+        devices_list.sort(key=_BY_SORT_KEY)
+        for device_info in devices_list:
+            del device_info['_sk']
         
         return jsonify({'success': True, 'devices': devices_list})
     except Exception as e:
@@ -573,19 +934,40 @@ def trust_current_device():
         logger.error(f"Error trusting current device: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+_TITLE_ASCII_ALNUM = frozenset(string.ascii_letters + string.digits)
+
+class _TitleCharFilter(dict):
+    """str.translate table keeping ASCII letters, digits and whitespace.
+
+    Same result as re.sub(r'[^a-zA-Z0-9\\s]', '', text); each code point's
+    verdict is computed on first sight and then served from the dict.
+    """
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        keep = codepoint if char in _TITLE_ASCII_ALNUM or char.isspace() else None
+        self[codepoint] = keep
+        return keep
+
+_TITLE_STRIP_TABLE = _TitleCharFilter()
+
 def generate_note_title(text_content):
     """Generate a simple filename-like title to match desktop app behavior"""
-    if not text_content or not text_content.strip():
+    if not text_content:
         return "Untitled.txt"
     
-    # Get first line and create a simple filename
-    first_line = text_content.split('\n')[0].strip()
+    # Get first line and create a simple filename; an all-whitespace text
+    # has an empty first line too, so the rest of the text is never scanned
+    return _title_from_first_line(text_content.partition('\n')[0].strip())
+
+@lru_cache(maxsize=1024)
+def _title_from_first_line(first_line):
+    """Build the title for a stripped first line; auto-saves repeat the same line"""
     if not first_line:
         return "Untitled.txt"
     
     # Extract key words and create simple filename like desktop app
     # Remove special characters but keep letters, numbers, spaces
-    clean_text = re.sub(r'[^a-zA-Z0-9\s]', '', first_line)
+    clean_text = first_line.translate(_TITLE_STRIP_TABLE)
     # Take first few meaningful words
     words = clean_text.split()
     if not words:
@@ -619,28 +1001,173 @@ def get_notes_file():
     """Get the path to the notes JSON file"""
     return os.path.join(NOTES_DIR, 'notes.json')
 
+# Single-note changes are appended to notes.log instead of rewriting
+# notes.json; load_notes() replays the log over the snapshot, and the log is
+# folded back into the snapshot at startup and once it outgrows the limit.
+# Appends are serialized by an in-process lock, so this assumes the single
+# worker process the Procfile runs.
+NOTES_LOG_FILE = os.path.join(NOTES_DIR, 'notes.log')
+NOTES_LOG_COMPACT_BYTES = 1024 * 1024
+
+_notes_lock = threading.RLock()
+_notes_log_file = None  # Opened lazily in append mode
+# Parsed snapshot plus replayed log, and how far into the log it has read
+_notes_state = {'snapshot_mtime': None, 'log_offset': 0, 'data': {}}
+
+def _get_notes_log():
+    """Return the notes log opened for appending (lock held)"""
+    global _notes_log_file
+    if _notes_log_file is None:
+        _notes_log_file = open(NOTES_LOG_FILE, 'ab')
+    return _notes_log_file
+
+def _refresh_notes_state():
+    """Bring _notes_state up to date with notes.json and notes.log (lock held)"""
+    state = _notes_state
+    try:
+        snapshot_mtime = os.stat(get_notes_file()).st_mtime_ns
+    except FileNotFoundError:
+        snapshot_mtime = None
+    try:
+        log_size = os.stat(NOTES_LOG_FILE).st_size
+    except FileNotFoundError:
+        log_size = 0
+    
+    if snapshot_mtime != state['snapshot_mtime'] or log_size < state['log_offset']:
+        data = {}
+        if snapshot_mtime is not None:
+            with open(get_notes_file(), 'rb') as f:
+                data = _json_loads(f.read())
+        state.update(snapshot_mtime=snapshot_mtime, log_offset=0, data=data)
+    
+    if log_size > state['log_offset']:
+        with open(NOTES_LOG_FILE, 'rb') as f:
+            f.seek(state['log_offset'])
+            chunk = f.read(log_size - state['log_offset'])
+        # Only replay complete lines; a partial trailing entry is read next time
+        end = chunk.rfind(b'\n') + 1
+        for line in chunk[:end].splitlines():
+            if not line:
+                continue
+            try:
+                entry = _json_loads(line)
+                if entry['op'] == 'put':
+                    state['data'][entry['id']] = entry['note']
+                elif entry['op'] == 'del':
+                    state['data'].pop(entry['id'], None)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable notes log entry: {e}")
+        state['log_offset'] += end
+    
+    return state['data']
+
 def load_notes():
-    """Load all notes from JSON file"""
+    """Load all notes from the JSON snapshot and the notes log"""
     try:
-        notes_file = get_notes_file()
-        if os.path.exists(notes_file):
-            with open(notes_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        with _notes_lock:
+            notes = _refresh_notes_state()
+            return {note_id: dict(note_data) for note_id, note_data in notes.items()}
     except Exception as e:
         logger.error(f"Error loading notes: {e}")
     return {}
 
+def load_note(note_id):
+    """Load a single note, or None if it does not exist"""
+    try:
+        with _notes_lock:
+            note_data = _refresh_notes_state().get(note_id)
+            return dict(note_data) if note_data is not None else None
+    except Exception as e:
+        logger.error(f"Error loading note {note_id}: {e}")
+    return None
+
+def sorted_note_items():
+    """Return [(note_id, note_data)] newest-modified first.
+
+    The note dicts are shared with the cache (entries are replaced, never
+    edited in place), so callers must not mutate them.
+    """
+    with _notes_lock:
+        notes = _refresh_notes_state()
+        return sorted(notes.items(), key=lambda item: item[1].get('modified', ''), reverse=True)
+
 def save_notes(notes):
-    """Save all notes to JSON file"""
+    """Replace all notes: write a fresh JSON snapshot and empty the notes log"""
     try:
-        notes_file = get_notes_file()
-        with open(notes_file, 'w', encoding='utf-8') as f:
-            json.dump(notes, f, indent=2, ensure_ascii=False)
+        with _notes_lock:
+            snapshot_mtime = _atomic_write_json(get_notes_file(), notes)
+            # A crash before this truncate only replays entries the snapshot already has
+            _get_notes_log().truncate(0)
+            _notes_state.update(
+                snapshot_mtime=snapshot_mtime,
+                log_offset=0,
+                data={note_id: dict(note_data) for note_id, note_data in notes.items()},
+            )
         return True
     except Exception as e:
         logger.error(f"Error saving notes: {e}")
         return False
 
+def _append_notes_log(*entries):
+    """Durably append changes to the notes log, compacting it if it got too big"""
+    lines = b''.join(_json_dumps_compact(entry) + b'\n' for entry in entries)
+    try:
+        with _notes_lock:
+            log = _get_notes_log()
+            log.write(lines)
+            log.flush()
+            os.fsync(log.fileno())
+            if log.tell() > NOTES_LOG_COMPACT_BYTES:
+                compact_notes()
+        return True
+    except Exception as e:
+        logger.error(f"Error saving notes: {e}")
+        return False
+
+def note_version(note_data):
+    """Return the note's version counter.
+
+    Notes written before versions existed get one derived from their
+    'modified' timestamp in milliseconds, which is what the first bump
+    would have produced.
+    """
+    version = note_data.get('version')
+    if isinstance(version, int):
+        return version
+    try:
+        return int(datetime.fromisoformat(note_data.get('modified', '')).timestamp() * 1000)
+    except (TypeError, ValueError):
+        return 0
+
+def save_note(note_id, note_data):
+    """Persist one created or updated note, bumping its version in place"""
+    # Wall-clock milliseconds keep versions comparable with migrated notes,
+    # and the +1 keeps them increasing even if the clock steps back
+    note_data['version'] = max(note_version(note_data) + 1, time.time_ns() // 1_000_000)
+    return _append_notes_log({'op': 'put', 'id': note_id, 'note': note_data})
+
+def save_changed_notes(changes):
+    """Persist several created or updated notes with a single log append"""
+    return _append_notes_log(*({'op': 'put', 'id': note_id, 'note': note_data}
+                               for note_id, note_data in changes.items()))
+
+def delete_saved_note(note_id):
+    """Persist the deletion of one note"""
+    return _append_notes_log({'op': 'del', 'id': note_id})
+
+def compact_notes():
+    """Fold the notes log into a new notes.json snapshot"""
+    try:
+        with _notes_lock:
+            return save_notes(_refresh_notes_state())
+    except Exception as e:
+        logger.error(f"Error compacting notes log: {e}")
+        return False
+
+# Fold in whatever log the previous process left behind
+if os.path.exists(NOTES_LOG_FILE) and os.path.getsize(NOTES_LOG_FILE):
+    compact_notes()
+
 @app.route('/health')
 def health_check():
     """Simple health check endpoint for Railway"""
@@ -648,7 +1175,7 @@ def health_check():
         'status': 'healthy',
         'app': 'Web Mobile Noted',
         'version': '1.1.0-onedrive-fix',
-        'timestamp': datetime.now().isoformat(),
+        'timestamp': now_iso(),
         'environment': 'production' if (os.environ.get('RAILWAY_ENVIRONMENT') or os.environ.get('PORT')) else 'development'
     })
 
@@ -667,7 +1194,6 @@ def debug_info():
             'NOTED_USERNAME': 'SET' if os.environ.get('NOTED_USERNAME') else 'NOT_SET',
             'NOTED_PASSWORD_HASH': 'SET' if os.environ.get('NOTED_PASSWORD_HASH') else 'NOT_SET'
         },
-        'session_dir': app.config.get('SESSION_FILE_DIR', 'default'),
         'notes_dir': NOTES_DIR
     })
 
@@ -692,25 +1218,100 @@ def index():
     
     return response
 
+# Streamed bodies go to the server, and the compressor, in blocks of about
+# this size instead of one note at a time
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def _coalesce_chunks(chunks, size=STREAM_CHUNK_SIZE):
+    """Join small byte chunks into blocks of at least size bytes"""
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield b''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield b''.join(buffer)
+
 @app.route('/api/notes', methods=['GET'])
 @login_required
 @limiter.limit("30 per minute")
 def get_notes():
     """Get all notes"""
     try:
-        notes = load_notes()
-        # Convert to list and sort by modified date
-        notes_list = []
-        for note_id, note_data in notes.items():
-            note_data['id'] = note_id
-            notes_list.append(note_data)
+        note_items = sorted_note_items()
+        
+        # Encode one note at a time instead of building the whole list and body
+        def generate():
+            yield b'{"success":true,"notes":['
+            for index, (note_id, note_data) in enumerate(note_items):
+                chunk = _json_dumps_compact({**note_data, 'id': note_id})
+                yield chunk if index == 0 else b',' + chunk
+            yield b']}'
         
-        notes_list.sort(key=lambda x: x.get('modified', ''), reverse=True)
-        return jsonify({'success': True, 'notes': notes_list})
+        return Response(_coalesce_chunks(generate()), mimetype='application/json')
     except Exception as e:
         logger.error(f"Error getting notes: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def onedrive_etags():
+    """Map the OneDrive item ID of each pulled note to the eTag it was pulled at"""
+    with _notes_lock:
+        return {
+            note_data['onedrive_id']: note_data['onedrive_etag']
+            for note_data in _refresh_notes_state().values()
+            if note_data.get('onedrive_id') and note_data.get('onedrive_etag')
+        }
+
+def store_pulled_notes(result, merge_strategy):
+    """Save notes pulled from OneDrive, writing only what differs locally.
+
+    With 'merge', result['notes'] becomes the merged set. It shares note
+    dicts with the notes cache rather than copying every note, which is
+    safe because cached entries are replaced, never edited in place.
+    """
+    pulled_notes = result['notes']
+    with _notes_lock:
+        local_notes = _refresh_notes_state()
+        if merge_strategy == 'replace':
+            # Replace all local notes, unless OneDrive holds exactly what we have
+            if pulled_notes != local_notes:
+                save_notes(pulled_notes)
+        elif merge_strategy == 'merge':
+            # Merge with local notes (OneDrive takes precedence for conflicts)
+            changed = {
+                note_id: note_data for note_id, note_data in pulled_notes.items()
+                if local_notes.get(note_id) != note_data
+            }
+            if changed:
+                save_changed_notes(changed)
+            result['notes'] = {**local_notes, **changed}
+
+# Results with more notes than this are streamed; smaller ones are sent whole
+# so they keep a Content-Length
+STREAM_NOTES_THRESHOLD = 50
+
+def stream_notes_result(result):
+    """Return a result dict as JSON, streaming its 'notes' mapping one note at
+    a time when it is large"""
+    notes = result.get('notes') or {}
+    if len(notes) <= STREAM_NOTES_THRESHOLD:
+        return jsonify(result)
+    head = _json_dumps_compact({key: value for key, value in result.items() if key != 'notes'})
+    
+    def generate():
+        # Reopen the encoded head object and append the notes member to it
+        yield head[:-1] + (b',"notes":{' if len(head) > 2 else b'"notes":{')
+        for index, (note_id, note_data) in enumerate(notes.items()):
+            chunk = _json_dumps_compact(note_id) + b':' + _json_dumps_compact(note_data)
+            yield chunk if index == 0 else b',' + chunk
+        yield b'}}'
+    
+    return Response(_coalesce_chunks(generate()), mimetype='application/json')
+
 @app.route('/api/notes', methods=['POST'])
 @login_required
 @limiter.limit("10 per minute")
@@ -722,7 +1323,7 @@ def create_note():
         
         data = request.get_json()
         note_id = str(uuid.uuid4())
-        timestamp = datetime.now().isoformat()
+        timestamp = now_iso()
         
         # Generate title from first line of text
         text_content = data.get('text', '')
@@ -736,10 +1337,7 @@ def create_note():
             'owner': session.get('username', 'anonymous')
         }
         
-        notes = load_notes()
-        notes[note_id] = note_data
-        
-        if save_notes(notes):
+        if save_note(note_id, note_data):
             note_data['id'] = note_id
             return jsonify({'success': True, 'note': note_data})
         else:
@@ -758,33 +1356,34 @@ def update_note(note_id):
         validate_csrf_if_enabled(request.headers.get('X-CSRFToken'))
         
         data = request.get_json()
-        notes = load_notes()
+        note = load_note(note_id)
         
-        if note_id not in notes:
+        if note is None:
             return jsonify({'success': False, 'error': 'Note not found'}), 404
         
         # Check ownership (optional: remove if you want shared notes)
-        if notes[note_id].get('owner') != session.get('username') and session.get('username') != USERNAME:
+        user = session.get('username')
+        if note.get('owner') != user and user != USERNAME:
             return jsonify({'success': False, 'error': 'Access denied'}), 403
         
         # Update text content
-        text_content = data.get('text', notes[note_id]['text'])
-        notes[note_id]['text'] = text_content
+        text_content = data.get('text', note['text'])
+        note['text'] = text_content
         
         # Only update title if explicitly provided or if note has no title yet
         if 'title' in data:
             # User provided explicit title
-            notes[note_id]['title'] = data['title']
-        elif not notes[note_id].get('title'):
+            note['title'] = data['title']
+        elif not note.get('title'):
             # Note has no title, auto-generate one
-            notes[note_id]['title'] = generate_note_title(text_content)
+            note['title'] = generate_note_title(text_content)
         # Otherwise, preserve existing title
         
-        notes[note_id]['modified'] = datetime.now().isoformat()
+        note['modified'] = now_iso()
         
-        if save_notes(notes):
-            notes[note_id]['id'] = note_id
-            return jsonify({'success': True, 'note': notes[note_id]})
+        if save_note(note_id, note):
+            note['id'] = note_id
+            return jsonify({'success': True, 'note': note})
         else:
             return jsonify({'success': False, 'error': 'Failed to save note'}), 500
     except Exception as e:
@@ -805,17 +1404,13 @@ def save_offline_notes():
         device_id = data.get('device_id', 'unknown')
         
         # Save to temporary offline storage
-        offline_dir = os.path.join(NOTES_DIR, 'offline')
-        os.makedirs(offline_dir, exist_ok=True)
-        
-        offline_file = os.path.join(offline_dir, f'offline_{device_id}.json')
-        with open(offline_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                'notes': offline_notes,
-                'device_id': device_id,
-                'timestamp': datetime.now().isoformat(),
-                'synced': False
-            }, f, indent=2, ensure_ascii=False)
+        offline_file = os.path.join(OFFLINE_DIR, f'offline_{device_id}.json')
+        _atomic_write_json(offline_file, {
+            'notes': offline_notes,
+            'device_id': device_id,
+            'timestamp': now_iso(),
+            'synced': False
+        })
         
         return jsonify({'success': True, 'message': 'Notes saved offline'})
     except Exception as e:
@@ -834,15 +1429,14 @@ def sync_offline_notes():
         data = request.get_json()
         device_id = data.get('device_id', 'unknown')
         
-        offline_dir = os.path.join(NOTES_DIR, 'offline')
-        offline_file = os.path.join(offline_dir, f'offline_{device_id}.json')
+        offline_file = os.path.join(OFFLINE_DIR, f'offline_{device_id}.json')
         
         if not os.path.exists(offline_file):
             return jsonify({'success': True, 'message': 'No offline notes to sync'})
         
         # Load offline notes
-        with open(offline_file, 'r', encoding='utf-8') as f:
-            offline_data = json.load(f)
+        with open(offline_file, 'rb') as f:
+            offline_data = _json_loads(f.read())
         
         if offline_data.get('synced', False):
             return jsonify({'success': True, 'message': 'Notes already synced'})
@@ -851,18 +1445,20 @@ def sync_offline_notes():
         current_notes = load_notes()
         offline_notes = offline_data.get('notes', {})
         
-        # Add or update notes from offline storage
-        for note_id, note_data in offline_notes.items():
-            if note_id not in current_notes or note_data.get('modified', '') > current_notes.get(note_id, {}).get('modified', ''):
-                current_notes[note_id] = note_data
+        # Only notes that are new or newer than the server copy need writing
+        changed = {
+            note_id: note_data for note_id, note_data in offline_notes.items()
+            if note_id not in current_notes
+            or note_version(note_data) > note_version(current_notes[note_id])
+        }
+        current_notes.update(changed)
         
         # Save merged notes
-        if save_notes(current_notes):
+        if not changed or save_changed_notes(changed):
             # Mark as synced
             offline_data['synced'] = True
-            offline_data['sync_timestamp'] = datetime.now().isoformat()
-            with open(offline_file, 'w', encoding='utf-8') as f:
-                json.dump(offline_data, f, indent=2, ensure_ascii=False)
+            offline_data['sync_timestamp'] = now_iso()
+            _atomic_write_json(offline_file, offline_data)
             
             return jsonify({'success': True, 'message': 'Offline notes synced successfully', 'notes': current_notes})
         else:
@@ -887,22 +1483,23 @@ def update_note_title(note_id):
         if not new_title:
             return jsonify({'success': False, 'error': 'Title cannot be empty'}), 400
             
-        notes = load_notes()
+        note = load_note(note_id)
         
-        if note_id not in notes:
+        if note is None:
             return jsonify({'success': False, 'error': 'Note not found'}), 404
         
         # Check ownership
-        if notes[note_id].get('owner') != session.get('username') and session.get('username') != USERNAME:
+        user = session.get('username')
+        if note.get('owner') != user and user != USERNAME:
             return jsonify({'success': False, 'error': 'Access denied'}), 403
         
         # Update only the title
-        notes[note_id]['title'] = new_title
-        notes[note_id]['modified'] = datetime.now().isoformat()
+        note['title'] = new_title
+        note['modified'] = now_iso()
         
-        if save_notes(notes):
-            notes[note_id]['id'] = note_id
-            return jsonify({'success': True, 'note': notes[note_id]})
+        if save_note(note_id, note):
+            note['id'] = note_id
+            return jsonify({'success': True, 'note': note})
         else:
             return jsonify({'success': False, 'error': 'Failed to save note'}), 500
     except Exception as e:
@@ -919,18 +1516,17 @@ def delete_note(note_id):
         # Validate CSRF for API requests
         validate_csrf_if_enabled(request.headers.get('X-CSRFToken'))
         
-        notes = load_notes()
+        note = load_note(note_id)
         
-        if note_id not in notes:
+        if note is None:
             return jsonify({'success': False, 'error': 'Note not found'}), 404
         
         # Check ownership (optional: remove if you want shared notes)
-        if notes[note_id].get('owner') != session.get('username') and session.get('username') != USERNAME:
+        user = session.get('username')
+        if note.get('owner') != user and user != USERNAME:
             return jsonify({'success': False, 'error': 'Access denied'}), 403
         
-        del notes[note_id]
-        
-        if save_notes(notes):
+        if delete_saved_note(note_id):
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'error': 'Failed to delete note'}), 500
@@ -952,6 +1548,31 @@ def csrf_token():
     else:
         return jsonify({'error': 'CSRF protection disabled'}), 404
 
+# is_authenticated() asks MSAL for a token on every call; the status polls and
+# sync routes hit it constantly, so reuse the answer for a few seconds. The
+# manager holds one OneDrive account for the whole process, so one entry
+# serves every session.
+ONEDRIVE_AUTH_CACHE_TTL = 5
+_onedrive_auth_cache = {'expires': 0.0, 'value': False}
+
+def onedrive_authenticated():
+    """Return onedrive_manager.is_authenticated(), cached for a few seconds"""
+    now = time.monotonic()
+    if now >= _onedrive_auth_cache['expires']:
+        _onedrive_auth_cache['value'] = onedrive_manager.is_authenticated()
+        _onedrive_auth_cache['expires'] = now + ONEDRIVE_AUTH_CACHE_TTL
+    return _onedrive_auth_cache['value']
+
+def invalidate_onedrive_auth_cache():
+    """Forget the cached auth state after signing in or out"""
+    _onedrive_auth_cache['expires'] = 0.0
+    _auth_done.clear()
+
+# Sessions whose device flow recently succeeded. Browsers can keep polling the
+# auth check after success, so answer them without touching the flow store.
+AUTH_DONE_TTL = 60
+_auth_done = {}  # session_id -> time.monotonic() of the successful check
+
 @app.route('/api/onedrive/status', methods=['GET'])
 @login_required
 def onedrive_status():
@@ -979,18 +1600,67 @@ def onedrive_status():
             'error': str(e)
         }), 500
 
+# Device codes handed out per session, so a repeated "connect" click shows the
+# code already on screen instead of requesting a new one from Microsoft
+DEVICE_FLOW_REUSE_MARGIN = 30  # Seconds of code lifetime a reused flow must have left
+_device_flow_cache = {}  # session_id -> (flow started_at, auth_flow response)
+_device_flow_cache_lock = threading.Lock()
+
+# Clients wait this much longer than Microsoft's poll interval so timer drift
+# never brings a poll in early and earns a slow_down
+DEVICE_FLOW_POLL_BUFFER = 1.2
+
+# Start-auth success responses always have this shape; fill in the fields
+# instead of serializing a nested dict on every connect click
+AUTH_FLOW_TEMPLATE = (b'{"success":true,"auth_flow":{"user_code":%b,"verification_uri":%b,'
+                      b'"expires_in":%d,"interval":%d}}')
+
+def auth_flow_response(auth_flow):
+    """Return the JSON response for a started (or reused) device flow"""
+    body = AUTH_FLOW_TEMPLATE % (_json_dumps_compact(auth_flow['user_code']),
+                                 _json_dumps_compact(auth_flow['verification_uri']),
+                                 auth_flow['expires_in'], auth_flow['interval'])
+    return Response(body, mimetype='application/json')
+
+def start_device_flow_cached(session_id):
+    """Start a device flow for the session, or return its still-pending one"""
+    _auth_done.pop(session_id, None)
+    with _device_flow_cache_lock:
+        cached = _device_flow_cache.get(session_id)
+    if cached:
+        started_at, auth_flow = cached
+        snap = onedrive_manager.get_flow_snapshot(session_id)
+        # Microsoft's own code lifetime, not the extended polling window, decides reuse
+        if (snap is not None and snap.started_at == started_at and not snap.completed
+                and isinstance(snap.original, (int, float))
+                and time.time() < started_at + snap.original - DEVICE_FLOW_REUSE_MARGIN):
+            # Count down from where the first response left off
+            return {**auth_flow, 'expires_in': int(started_at + snap.timeout - time.time())}
+    
+    auth_flow = onedrive_manager.start_device_flow_auth(session_id)
+    snap = onedrive_manager.get_flow_snapshot(session_id) if auth_flow else None
+    now = time.time()
+    with _device_flow_cache_lock:
+        # Codes live 15 minutes, so anything an hour old is long dead
+        for stale_id in [sid for sid, (started_at, _) in _device_flow_cache.items() if now - started_at > 3600]:
+            del _device_flow_cache[stale_id]
+        if snap is not None:
+            _device_flow_cache[session_id] = (snap.started_at, auth_flow)
+        else:
+            _device_flow_cache.pop(session_id, None)
+    return auth_flow
+
 @app.route('/api/onedrive/auth/start', methods=['POST'])
 @login_required
 @limiter.limit("5 per minute")
 def start_onedrive_auth():
     """Start OneDrive device flow authentication"""
-    logger.info("🔧 DEBUG: OneDrive auth start endpoint called")
-    logger.info(f"🔧 DEBUG: ONEDRIVE_AVAILABLE = {ONEDRIVE_AVAILABLE}")
-    logger.info(f"🔧 DEBUG: onedrive_manager exists = {onedrive_manager is not None}")
-    logger.info(f"🔧 DEBUG: NOTED_CLIENT_ID set = {bool(os.environ.get('NOTED_CLIENT_ID'))}")
+    if DEBUG_ONEDRIVE:
+        logger.debug("🔧 OneDrive auth start: available=%s, manager=%s, NOTED_CLIENT_ID set=%s",
+                     ONEDRIVE_AVAILABLE, onedrive_manager is not None, _CLIENT_ID_PRESENT)
     
     if not ONEDRIVE_AVAILABLE or not onedrive_manager:
-        logger.error("🔧 DEBUG: OneDrive not available - returning 503")
+        logger.error("🔧 OneDrive not available - returning 503")
         return jsonify({'success': False, 'error': 'OneDrive not available'}), 503
     
     try:
@@ -999,16 +1669,13 @@ def start_onedrive_auth():
         session_id = session.get('session_id', str(uuid.uuid4()))
         session['session_id'] = session_id
         
-        auth_flow = onedrive_manager.start_device_flow_auth(session_id)
+        auth_flow = start_device_flow_cached(session_id)
         
         if auth_flow:
-            return jsonify({
-                'success': True,
-                'auth_flow': auth_flow
-            })
+            return auth_flow_response(auth_flow)
         else:
             # Check if it's a missing client ID issue
-            if not os.environ.get('NOTED_CLIENT_ID'):
+            if not _CLIENT_ID_PRESENT:
                 return jsonify({
                     'success': False,
                     'error': 'OneDrive not configured: NOTED_CLIENT_ID environment variable is missing. Please set it in Railway dashboard.'
@@ -1024,7 +1691,8 @@ def start_onedrive_auth():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/onedrive/auth/check', methods=['GET'])
-@limiter.limit("30 per minute")  # Higher limit for auth polling
+@limiter.exempt
+@poll_limiter.limit("30 per minute")  # Higher limit for auth polling
 @login_required
 def check_onedrive_auth():
     """Check OneDrive authentication flow status"""
@@ -1037,6 +1705,8 @@ def check_onedrive_auth():
             return jsonify({'success': False, 'error': 'No active session'}), 400
         
         result = onedrive_manager.check_device_flow_status(session_id)
+        if result.get('status') == 'success':
+            invalidate_onedrive_auth_cache()
         return jsonify(result)
         
     except Exception as e:
@@ -1044,7 +1714,8 @@ def check_onedrive_auth():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/onedrive/auth/simple-check', methods=['GET'])
-@limiter.limit("60 per minute")  # Higher limit for simple checks
+@limiter.exempt
+@poll_limiter.limit("60 per minute")  # Higher limit for simple checks
 def simple_onedrive_check():
     """Simple OneDrive authentication status check without session requirements"""
     if not ONEDRIVE_AVAILABLE or not onedrive_manager:
@@ -1052,7 +1723,7 @@ def simple_onedrive_check():
     
     try:
         # Basic check without requiring session
-        authenticated = onedrive_manager.is_authenticated()
+        authenticated = onedrive_authenticated()
         return jsonify({
             'success': True, 
             'authenticated': authenticated,
@@ -1093,6 +1764,7 @@ def clear_onedrive_auth():
     try:
         # Don't require CSRF for this debug endpoint
         success = onedrive_manager.clear_session_auth()
+        invalidate_onedrive_auth_cache()
         return jsonify({
             'success': success,
             'message': 'OneDrive authentication cleared from session' if success else 'Failed to clear authentication'
@@ -1103,7 +1775,8 @@ def clear_onedrive_auth():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/onedrive/debug/flow-status', methods=['GET'])
-@limiter.limit("20 per minute")
+@limiter.exempt
+@poll_limiter.limit("20 per minute")
 def debug_device_flow():
     """Debug endpoint to check device flow internal state"""
     if not ONEDRIVE_AVAILABLE or not onedrive_manager:
@@ -1115,30 +1788,28 @@ def debug_device_flow():
             return jsonify({'success': False, 'error': 'No active session'}), 400
         
         # Get internal flow state
-        flows = getattr(onedrive_manager, '_auth_flows', {})
-        if session_id in flows:
-            flow_data = flows[session_id]
-            elapsed = time.time() - flow_data["started_at"]
-            timeout = flow_data.get("extended_expires_in", flow_data["flow"].get("expires_in", 2700))
+        snap = onedrive_manager.get_flow_snapshot(session_id)
+        if snap is not None:
+            elapsed = time.time() - snap.started_at
             
             return jsonify({
                 'success': True,
                 'session_id': session_id,
-                'started_at': flow_data["started_at"],
+                'started_at': snap.started_at,
                 'elapsed_seconds': elapsed,
-                'timeout_seconds': timeout,
+                'timeout_seconds': snap.timeout,
                 'elapsed_minutes': elapsed / 60,
-                'timeout_minutes': timeout / 60,
-                'completed': flow_data.get("completed", False),
-                'original_timeout': flow_data.get("original_expires_in", "unknown"),
-                'extended_timeout': flow_data.get("extended_expires_in", "unknown")
+                'timeout_minutes': snap.timeout / 60,
+                'completed': snap.completed,
+                'original_timeout': snap.original,
+                'extended_timeout': snap.extended
             })
         else:
             return jsonify({
                 'success': True,
                 'message': 'No active device flow',
                 'session_id': session_id,
-                'available_flows': list(flows.keys())
+                'available_flows': onedrive_manager.active_flow_sessions()
             })
         
     except Exception as e:
@@ -1158,20 +1829,11 @@ def extend_device_flow_timeout():
         if not session_id:
             return jsonify({'success': False, 'error': 'No active session'}), 400
         
-        # Get internal flow state
-        flows = getattr(onedrive_manager, '_auth_flows', {})
-        if session_id in flows:
-            flow_data = flows[session_id]
-            
-            # Extend timeout by another 30 minutes
-            additional_time = 1800  # 30 minutes
-            current_timeout = flow_data.get("extended_expires_in", flow_data["flow"].get("expires_in", 2700))
-            new_timeout = current_timeout + additional_time
-            
-            # Update the flow data
-            flow_data["extended_expires_in"] = new_timeout
-            flow_data["flow"]["expires_in"] = new_timeout
-            
+        # Extend timeout by another 30 minutes
+        additional_time = 1800
+        new_timeout = onedrive_manager.extend_device_flow(session_id, additional_time)
+        
+        if new_timeout is not None:
             logger.info(f"🕐 Extended device flow timeout for session {session_id} by {additional_time}s to {new_timeout}s total")
             
             return jsonify({
@@ -1199,13 +1861,14 @@ def cleanup_onedrive_duplicates():
     try:
         validate_csrf_if_enabled(request.headers.get('X-CSRFToken'))
         
-        if not onedrive_manager.is_authenticated():
+        if not onedrive_authenticated():
             return jsonify({
                 'success': False,
                 'error': 'Not authenticated with OneDrive'
             }), 401
         
         result = onedrive_manager.cleanup_duplicate_notes()
+        invalidate_onedrive_list_cache()
         return jsonify(result)
         
     except Exception as e:
@@ -1223,12 +1886,97 @@ def onedrive_logout():
         validate_csrf_if_enabled(request.headers.get('X-CSRFToken'))
         
         success = onedrive_manager.logout()
+        invalidate_onedrive_auth_cache()
         return jsonify({'success': success})
         
     except Exception as e:
         logger.error(f"Error logging out from OneDrive: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Pushes run in the background so the request returns as soon as the job is
+# queued; the client polls /api/onedrive/sync/status/<job_id>. One worker,
+# since every push uploads the same notes to the same OneDrive folder.
+ONEDRIVE_SYNC_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix='onedrive-sync')
+SYNC_JOB_RETENTION = 600  # Seconds a finished job's result stays pollable
+_sync_jobs = {}  # job_id -> {'future': Future, 'submitted': epoch seconds}
+_queued_pushes = {}  # session_id -> job_id of its push that hasn't started yet
+_sync_jobs_lock = threading.Lock()
+
+def store_onedrive_ids(pushed_notes):
+    """Record the OneDrive IDs a push gave the notes, appending only the notes
+    whose ID changed. The notes may have been edited while the upload ran,
+    and those edits must not be overwritten."""
+    with _notes_lock:
+        current_notes = _refresh_notes_state()
+        changed = {}
+        for note_id, note_data in pushed_notes.items():
+            current = current_notes.get(note_id)
+            onedrive_id = note_data.get('onedrive_id')
+            if current is not None and onedrive_id and current.get('onedrive_id') != onedrive_id:
+                changed[note_id] = {**current, 'onedrive_id': onedrive_id}
+        return not changed or save_changed_notes(changed)
+
+def _push_notes_to_onedrive():
+    """Background job: upload notes and record the OneDrive IDs they got"""
+    # Notes are read when the job starts, not when it was queued, so a push
+    # that absorbed later requests uploads their edits too
+    result = onedrive_manager.sync_notes_to_cloud(load_notes())
+    invalidate_onedrive_list_cache()
+    if result['success']:
+        store_onedrive_ids(result['notes'])
+    return result
+
+def submit_onedrive_push(session_id):
+    """Queue a push of the current notes to OneDrive and return its job id.
+
+    A session gets at most one push waiting in the queue: while one hasn't
+    started, further pushes share its job id instead of queueing another.
+    """
+    now = time.time()
+    with _sync_jobs_lock:
+        # Forget finished jobs nobody polled for
+        for old_id in [old_id for old_id, job in _sync_jobs.items()
+                       if job['future'].done() and now - job['submitted'] > SYNC_JOB_RETENTION]:
+            del _sync_jobs[old_id]
+        for old_session in [sid for sid, queued_id in _queued_pushes.items()
+                            if queued_id not in _sync_jobs or _sync_jobs[queued_id]['future'].done()]:
+            del _queued_pushes[old_session]
+        
+        queued_id = _queued_pushes.get(session_id)
+        queued = _sync_jobs.get(queued_id)
+        if queued and not queued['future'].running() and not queued['future'].done():
+            return queued_id
+        
+        job_id = uuid.uuid4().hex
+        _sync_jobs[job_id] = {
+            'future': ONEDRIVE_SYNC_POOL.submit(_push_notes_to_onedrive),
+            'submitted': now
+        }
+        _queued_pushes[session_id] = job_id
+    return job_id
+
+@app.route('/api/onedrive/sync/status/<job_id>', methods=['GET'])
+@limiter.exempt
+@poll_limiter.limit("60 per minute")
+@login_required
+def onedrive_sync_status(job_id):
+    """Report whether a queued OneDrive push has finished, with its result"""
+    with _sync_jobs_lock:
+        job = _sync_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown sync job'}), 404
+    
+    future = job['future']
+    if not future.done():
+        return jsonify({'success': True, 'done': False, 'job_id': job_id})
+    
+    try:
+        result = future.result()
+    except Exception as e:
+        logger.error(f"Error syncing to OneDrive: {e}")
+        result = {'success': False, 'error': str(e)}
+    return stream_notes_result({**result, 'done': True, 'job_id': job_id})
+
 @app.route('/api/onedrive/sync/push', methods=['POST'])
 @login_required
 @limiter.limit("10 per minute")
@@ -1240,23 +1988,18 @@ def sync_to_onedrive():
     try:
         validate_csrf_if_enabled(request.headers.get('X-CSRFToken'))
         
-        if not onedrive_manager.is_authenticated():
+        if not onedrive_authenticated():
             return jsonify({
                 'success': False,
                 'error': 'Not authenticated with OneDrive'
             }), 401
         
-        # Load local notes
-        local_notes = load_notes()
-        
-        # Sync to OneDrive
-        result = onedrive_manager.sync_notes_to_cloud(local_notes)
+        session_id = session.get('session_id', str(uuid.uuid4()))
+        session['session_id'] = session_id
         
-        if result['success']:
-            # Save updated notes with OneDrive IDs
-            save_notes(result['notes'])
-            
-        return jsonify(result)
+        # Sync to OneDrive in the background
+        job_id = submit_onedrive_push(session_id)
+        return jsonify({'success': True, 'queued': True, 'job_id': job_id}), 202
         
     except Exception as e:
         logger.error(f"Error syncing to OneDrive: {e}")
@@ -1273,14 +2016,15 @@ def sync_from_onedrive():
     try:
         validate_csrf_if_enabled(request.headers.get('X-CSRFToken'))
         
-        if not onedrive_manager.is_authenticated():
+        if not onedrive_authenticated():
             return jsonify({
                 'success': False,
                 'error': 'Not authenticated with OneDrive'
             }), 401
         
         # Get merge strategy from request (default: 'replace')
-        data = request.get_json() or {}
+        raw = request.get_data(cache=False)
+        data = (_json_loads(raw) if raw else None) or {}
         merge_strategy = data.get('merge_strategy', 'replace')
         max_notes = data.get('max_notes')  # No default limit - load all notes to match desktop
         
@@ -1290,10 +2034,13 @@ def sync_from_onedrive():
         result = None
         error = None
         
+        # A merge only needs the files that changed since we last pulled them
+        known_etags = onedrive_etags() if merge_strategy == 'merge' else None
+        
         def load_with_timeout():
             nonlocal result, error
             try:
-                result = onedrive_manager.load_notes_from_cloud(max_notes=max_notes)
+                result = onedrive_manager.load_notes_from_cloud(max_notes=max_notes, known_etags=known_etags)
             except Exception as e:
                 error = e
         
@@ -1317,22 +2064,22 @@ def sync_from_onedrive():
             return jsonify({'success': False, 'error': 'OneDrive sync failed unexpectedly'}), 500
         
         if result['success']:
-            if merge_strategy == 'replace':
-                # Replace all local notes
-                save_notes(result['notes'])
-            elif merge_strategy == 'merge':
-                # Merge with local notes (OneDrive takes precedence for conflicts)
-                local_notes = load_notes()
-                local_notes.update(result['notes'])
-                save_notes(local_notes)
-                result['notes'] = local_notes
+            store_pulled_notes(result, merge_strategy)
         
-        return jsonify(result)
+        return stream_notes_result(result)
         
     except Exception as e:
         logger.error(f"Error syncing from OneDrive: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Recent OneDrive listing, so repeat polls skip the Graph round trip
+ONEDRIVE_LIST_CACHE_TTL = 30
+_onedrive_list_cache = {'account': None, 'expires': 0.0, 'body': None, 'etag': None}
+
+def invalidate_onedrive_list_cache():
+    """Forget the cached OneDrive listing after notes there change"""
+    _onedrive_list_cache['expires'] = 0.0
+
 @app.route('/api/onedrive/notes', methods=['GET'])
 @login_required
 def list_onedrive_notes():
@@ -1341,18 +2088,34 @@ def list_onedrive_notes():
         return jsonify({'success': False, 'error': 'OneDrive not available'}), 503
     
     try:
-        if not onedrive_manager.is_authenticated():
+        if not onedrive_authenticated():
             return jsonify({
                 'success': False,
                 'error': 'Not authenticated with OneDrive'
             }), 401
         
-        notes_list = onedrive_manager.list_notes()
-        return jsonify({
-            'success': True,
-            'notes': notes_list,
-            'count': len(notes_list)
-        })
+        account = onedrive_manager.account or {}
+        account_id = account.get('home_account_id')
+        cache = _onedrive_list_cache
+        now = time.monotonic()
+        if cache['account'] != account_id or now >= cache['expires']:
+            notes_list = onedrive_manager.list_notes()
+            body = _json_dumps_compact({
+                'success': True,
+                'notes': notes_list,
+                'count': len(notes_list)
+            })
+            cache.update(
+                account=account_id,
+                expires=now + ONEDRIVE_LIST_CACHE_TTL,
+                body=body,
+                etag=hashlib.blake2b(body, digest_size=16).hexdigest()
+            )
+        
+        # Answers If-None-Match with an empty 304 when the listing is unchanged
+        response = Response(cache['body'], mimetype='application/json')
+        response.set_etag(cache['etag'])
+        return response.make_conditional(request)
         
     except Exception as e:
         logger.error(f"Error listing OneDrive notes: {e}")
@@ -1366,13 +2129,14 @@ def delete_onedrive_note(note_id):
         return jsonify({'success': False, 'error': 'OneDrive not available'}), 503
     
     try:
-        if not onedrive_manager.is_authenticated():
+        if not onedrive_authenticated():
             return jsonify({
                 'success': False,
                 'error': 'Not authenticated with OneDrive'
             }), 401
         
         success = onedrive_manager.delete_note(note_id)
+        invalidate_onedrive_list_cache()
         if success:
             return jsonify({'success': True})
         else:
@@ -1390,7 +2154,7 @@ def get_onedrive_note(note_id):
         return jsonify({'success': False, 'error': 'OneDrive not available'}), 503
     
     try:
-        if not onedrive_manager.is_authenticated():
+        if not onedrive_authenticated():
             return jsonify({
                 'success': False,
                 'error': 'Not authenticated with OneDrive'
@@ -1439,7 +2203,7 @@ def debug_onedrive():
             
             # Check session storage for OneDrive data
             onedrive_session_info = {
-                'has_token_cache': 'onedrive_token_cache' in session,
+                'has_token_cache': onedrive_manager.get_account() is not None,
                 'has_account_info': 'onedrive_account' in session,
                 'session_id': session.get('session_id', 'None'),
                 'session_permanent': session.permanent
@@ -1577,7 +2341,7 @@ def get_onedrive_token():
     
     try:
         # Check if authenticated
-        if not onedrive_manager.is_authenticated():
+        if not onedrive_authenticated():
             return jsonify({
                 'success': False,
                 'error': 'Not authenticated with OneDrive. Please authenticate first.',
@@ -1732,7 +2496,7 @@ def simple_sync_to_onedrive():
         # Use conditional CSRF validation
         validate_csrf_if_enabled(request.headers.get('X-CSRFToken'))
         
-        if not onedrive_manager.is_authenticated():
+        if not onedrive_authenticated():
             return jsonify({
                 'success': False,
                 'error': 'Not authenticated with OneDrive'
@@ -1743,12 +2507,13 @@ def simple_sync_to_onedrive():
         
         # Sync to OneDrive
         result = onedrive_manager.sync_notes_to_cloud(local_notes)
+        invalidate_onedrive_list_cache()
         
         if result['success']:
-            # Save updated notes with OneDrive IDs
-            save_notes(result['notes'])
+            # Save the OneDrive IDs the notes were given
+            store_onedrive_ids(result['notes'])
             
-        return jsonify(result)
+        return stream_notes_result(result)
         
     except Exception as e:
         logger.error(f"Error syncing to OneDrive: {e}")
@@ -1764,14 +2529,15 @@ def simple_sync_from_onedrive():
         # Use conditional CSRF validation
         validate_csrf_if_enabled(request.headers.get('X-CSRFToken'))
         
-        if not onedrive_manager.is_authenticated():
+        if not onedrive_authenticated():
             return jsonify({
                 'success': False,
                 'error': 'Not authenticated with OneDrive'
             }), 401
         
         # Get merge strategy from request (default: 'replace')
-        data = request.get_json() or {}
+        raw = request.get_data(cache=False)
+        data = (_json_loads(raw) if raw else None) or {}
         merge_strategy = data.get('merge_strategy', 'replace')
         max_notes = data.get('max_notes')  # No default limit - load all notes to match desktop
         
@@ -1781,10 +2547,13 @@ def simple_sync_from_onedrive():
         result = None
         error = None
         
+        # A merge only needs the files that changed since we last pulled them
+        known_etags = onedrive_etags() if merge_strategy == 'merge' else None
+        
         def load_with_timeout():
             nonlocal result, error
             try:
-                result = onedrive_manager.load_notes_from_cloud(max_notes=max_notes)
+                result = onedrive_manager.load_notes_from_cloud(max_notes=max_notes, known_etags=known_etags)
             except Exception as e:
                 error = e
         
@@ -1808,17 +2577,9 @@ def simple_sync_from_onedrive():
             return jsonify({'success': False, 'error': 'OneDrive sync failed unexpectedly'}), 500
         
         if result['success']:
-            if merge_strategy == 'replace':
-                # Replace all local notes
-                save_notes(result['notes'])
-            elif merge_strategy == 'merge':
-                # Merge with local notes (OneDrive takes precedence for conflicts)
-                local_notes = load_notes()
-                local_notes.update(result['notes'])
-                save_notes(local_notes)
-                result['notes'] = local_notes
+            store_pulled_notes(result, merge_strategy)
         
-        return jsonify(result)
+        return stream_notes_result(result)
         
     except Exception as e:
         logger.error(f"Error loading from OneDrive: {e}")
@@ -1827,8 +2588,6 @@ def simple_sync_from_onedrive():
 @app.route('/api/simple/onedrive/auth/start', methods=['POST'])
 def simple_start_onedrive_auth():
     """Start OneDrive auth without CSRF/auth requirements"""
-    logger.info("🔍 Simple OneDrive auth endpoint called")
-    
     if not ONEDRIVE_AVAILABLE or not onedrive_manager:
         logger.error(f"OneDrive not available: ONEDRIVE_AVAILABLE={ONEDRIVE_AVAILABLE}, manager={onedrive_manager is not None}")
         return jsonify({'success': False, 'error': 'OneDrive not available'}), 503
@@ -1840,30 +2599,26 @@ def simple_start_onedrive_auth():
         
         session_id = session.get('session_id', str(uuid.uuid4()))
         session['session_id'] = session_id
-        logger.info(f"🔍 Starting device flow for session: {session_id}")
         
-        auth_flow = onedrive_manager.start_device_flow_auth(session_id)
-        logger.info(f"🔍 Device flow result: {auth_flow is not None}")
+        auth_flow = start_device_flow_cached(session_id)
+        if DEBUG_ONEDRIVE:
+            logger.debug("🔍 Device flow for session %s: started=%s, keys=%s",
+                         session_id, auth_flow is not None, list(auth_flow) if auth_flow else None)
         
         if auth_flow:
-            logger.info(f"🔗 Started OneDrive device flow for session {session_id}")
-            logger.info(f"🔍 Auth flow keys: {list(auth_flow.keys()) if auth_flow else 'None'}")
-            return jsonify({
-                'success': True,
-                'auth_flow': auth_flow
-            })
+            logger.info("🔗 Started OneDrive device flow for session %s", session_id)
+            return auth_flow_response(auth_flow)
         else:
             logger.error("🔍 start_device_flow_auth returned None")
             # Check if it's a missing client ID issue
-            if not os.environ.get('NOTED_CLIENT_ID'):
+            if not _CLIENT_ID_PRESENT:
                 logger.error("🔍 NOTED_CLIENT_ID not found")
                 return jsonify({
                     'success': False,
                     'error': 'OneDrive setup required: Please set NOTED_CLIENT_ID environment variable with your Azure App Registration Client ID in Railway dashboard.'
                 }), 503
             else:
-                client_id = os.environ.get('NOTED_CLIENT_ID', '')
-                logger.error(f"🔍 NOTED_CLIENT_ID is set but auth flow failed: {client_id[:8] if client_id else 'None'}...")
+                logger.error("🔍 NOTED_CLIENT_ID is set but auth flow failed: %s...", _CLIENT_ID[:8])
                 return jsonify({
                     'success': False,
                     'error': 'OneDrive authentication flow failed to start - check server logs'
@@ -1878,8 +2633,6 @@ def simple_start_onedrive_auth():
 @app.route('/api/simple/onedrive/auth/check', methods=['GET'])
 def simple_check_onedrive_auth():
     """Simple OneDrive auth check without CSRF/auth requirements"""
-    logger.info("🔍 Simple OneDrive auth check endpoint called")
-    
     if not ONEDRIVE_AVAILABLE or not onedrive_manager:
         logger.error(f"OneDrive not available: ONEDRIVE_AVAILABLE={ONEDRIVE_AVAILABLE}, manager={onedrive_manager is not None}")
         return jsonify({'success': False, 'error': 'OneDrive not available'}), 503
@@ -1887,15 +2640,40 @@ def simple_check_onedrive_auth():
     try:
         session_id = session.get('session_id')
         if not session_id:
-            logger.info("🔍 No session ID found - no auth in progress")
+            if DEBUG_ONEDRIVE:
+                logger.debug("🔍 No session ID found - no auth in progress")
             return jsonify({
                 'status': 'error',
                 'message': 'No authentication in progress'
             })
         
-        logger.info(f"🔍 Checking auth progress for session: {session_id}")
+        if _auth_done.get(session_id, 0) > time.monotonic() - AUTH_DONE_TTL:
+            return jsonify({'status': 'success', 'message': 'Authentication successful', 'cached': True})
+        
         auth_result = onedrive_manager.check_device_flow_status(session_id)
-        logger.info(f"🔍 Auth check result: {auth_result}")
+        if DEBUG_ONEDRIVE:
+            logger.debug("🔍 Auth check for session %s: %s", session_id, auth_result)
+        if auth_result and auth_result.get('status') == 'success':
+            invalidate_onedrive_auth_cache()
+            now = time.monotonic()
+            # Drop sessions past the TTL while we're here, as the flow cache does
+            for done_id, done_at in list(_auth_done.items()):
+                if now - done_at > AUTH_DONE_TTL:
+                    _auth_done.pop(done_id, None)
+            _auth_done[session_id] = now
+        elif auth_result and auth_result.get('status') == 'pending':
+            auth_result['poll_after_ms'] = int(onedrive_manager.current_interval(session_id) * 1000 * DEVICE_FLOW_POLL_BUFFER)
+            # Pending answers repeat poll after poll; the browser keeps the last
+            # one and revalidates it, so an unchanged answer is a bodiless 304
+            etag = 'pending-' + hashlib.blake2b(
+                f"{session_id}|{auth_result['poll_after_ms']}|{auth_result.get('message')}".encode(),
+                digest_size=8).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                return '', 304, {'ETag': f'W/"{etag}"', 'Cache-Control': 'no-cache'}
+            response = jsonify(auth_result)
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
         
         if auth_result:
             return jsonify(auth_result)
@@ -5,91 +5,72 @@ WSGI entry point for Railway deployment with environment variable handling
 
 import os
 import sys
+from importlib import import_module
 
 # Add current directory to Python path
 sys.path.insert(0, os.path.dirname(__file__))
 
-def create_app():
-    """Create Flask app with proper error handling"""
-    try:
-        # Import the main Flask app using importlib
-        import importlib.util
-        spec = importlib.util.spec_from_file_location("web_mobile_noted", "web-mobile-noted.py")
-        if spec and spec.loader:
-            web_mobile_noted = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(web_mobile_noted)
-            return web_mobile_noted.app
-        else:
-            raise ImportError("Could not load web-mobile-noted.py")
-    except ValueError as e:
-        if "environment variable" in str(e):
-            # Create a temporary Flask app to show the error
-            from flask import Flask, jsonify
-            
-            error_app = Flask(__name__)
-            
-            @error_app.route('/health')
-            def health():
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Environment variables not configured',
-                    'required_vars': ['NOTED_USERNAME', 'NOTED_PASSWORD_HASH'],
-                    'error': str(e)
-                }), 500
-            
-            @error_app.route('/')
-            def root():
-                return f'''
-                <html>
-                <head><title>Configuration Required</title></head>
-                <body>
-                    <h1>🔧 Configuration Required</h1>
-                    <p>Please set the following environment variables in Railway:</p>
-                    <ul>
-                        <li><strong>NOTED_USERNAME</strong>: admin</li>
-                        <li><strong>NOTED_PASSWORD_HASH</strong>: [password hash]</li>
-                    </ul>
-                    <p>Error: {str(e)}</p>
-                    <p><a href="/health">Health Check</a></p>
-                </body>
-                </html>
-                '''
-            
-            return error_app
-        else:
-            raise
-    except Exception as e:
-        # Fallback error app for any other issues
-        from flask import Flask, jsonify
-        
-        error_app = Flask(__name__)
-        
-        @error_app.route('/health')
-        def health():
-            return jsonify({
-                'status': 'error',
-                'message': 'Application startup error',
-                'error': str(e)
-            }), 500
-        
-        @error_app.route('/')
-        def root():
+def _make_error_app(e):
+    """Create a Flask app that reports why the main app failed to start"""
+    from flask import Flask, jsonify
+
+    config_error = isinstance(e, ValueError)
+    error_app = Flask(__name__)
+
+    @error_app.route('/health')
+    def health():
+        body = {
+            'status': 'error',
+            'message': 'Environment variables not configured' if config_error else 'Application startup error',
+            'error': str(e)
+        }
+        if config_error:
+            body['required_vars'] = ['NOTED_USERNAME', 'NOTED_PASSWORD_HASH']
+        return jsonify(body), 500
+
+    @error_app.route('/')
+    def root():
+        if config_error:
             return f'''
             <html>
-            <head><title>Startup Error</title></head>
+            <head><title>Configuration Required</title></head>
             <body>
-                <h1>🚨 Startup Error</h1>
-                <p>Application failed to start: {str(e)}</p>
+                <h1>🔧 Configuration Required</h1>
+                <p>Please set the following environment variables in Railway:</p>
+                <ul>
+                    <li><strong>NOTED_USERNAME</strong>: admin</li>
+                    <li><strong>NOTED_PASSWORD_HASH</strong>: [password hash]</li>
+                </ul>
+                <p>Error: {str(e)}</p>
                 <p><a href="/health">Health Check</a></p>
             </body>
             </html>
             '''
-        
-        return error_app
+        return f'''
+        <html>
+        <head><title>Startup Error</title></head>
+        <body>
+            <h1>🚨 Startup Error</h1>
+            <p>Application failed to start: {str(e)}</p>
+            <p><a href="/health">Health Check</a></p>
+        </body>
+        </html>
+        '''
+
+    return error_app
 
-# Create the application
-application = create_app()
+# Import the main Flask app through the normal import system, so it is
+# registered in sys.modules and runs once; the Procfile serves the result
+# as wsgi:application
+try:
+    application = import_module("web-mobile-noted").app
+except ValueError as e:
+    if "environment variable" not in str(e):
+        raise
+    application = _make_error_app(e)
+except Exception as e:
+    application = _make_error_app(e)
 
 if __name__ == "__main__":
     port = int(os.environ.get('PORT', 5000))
-    application.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    application.run(host='0.0.0.0', port=port)